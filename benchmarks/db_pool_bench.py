@@ -0,0 +1,68 @@
+"""Бенчмарк пула соединений DatabaseManager.
+
+Сравнивает запросы/сек при конкурентной нагрузке обработчиков:
+старый способ (новое соединение на каждый запрос прямо в event loop),
+пул соединений с WAL без кэша пользователей и с кэшем (повторяющиеся id
+почти всегда попадают в кэш, поэтому числа выводятся раздельно).
+
+Запуск: python -m benchmarks.db_pool_bench [handlers] [requests]
+"""
+import os
+import sys
+import time
+import sqlite3
+import asyncio
+import tempfile
+from database.db_manager import DatabaseManager
+
+async def _legacy_query(db_path: str, telegram_id: str):
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM users WHERE telegram_id = ?', (telegram_id,))
+        cursor.fetchone()
+        cursor.execute('SELECT * FROM projects WHERE user_id = ?', (1,))
+        cursor.fetchall()
+
+async def _pooled_query(db: DatabaseManager, telegram_id: str):
+    await db.get_user(telegram_id)
+    await db.get_projects(1)
+
+async def _run(handlers: int, requests: int, query) -> float:
+    async def handler(n: int):
+        for i in range(requests):
+            await query(str((n * requests + i) % 100))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(handler(n) for n in range(handlers)))
+    return handlers * requests / (time.perf_counter() - started)
+
+async def main(handlers: int, requests: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        db = DatabaseManager(db_path)
+        for i in range(100):
+            await db.create_user(str(i), f"user{i}")
+        for i in range(50):
+            await db.create_project(1, f"project{i}", 'https://example.com/repo.git', f"/projects/p{i}", 300)
+        db.close()
+
+        legacy = await _run(handlers, requests, lambda tid: _legacy_query(db_path, tid))
+
+        # Без кэша каждый get_user идет в базу - измеряется именно пул
+        uncached_db = DatabaseManager(db_path, user_cache_size=0)
+        pooled = await _run(handlers, requests, lambda tid: _pooled_query(uncached_db, tid))
+        uncached_db.close()
+
+        cached_db = DatabaseManager(db_path)
+        cached = await _run(handlers, requests, lambda tid: _pooled_query(cached_db, tid))
+        cached_db.close()
+
+    print(f"handlers={handlers} requests/handler={requests}")
+    print(f"connect-per-query:       {legacy:10.0f} req/s")
+    print(f"connection pool:         {pooled:10.0f} req/s")
+    print(f"pool + user cache:       {cached:10.0f} req/s")
+
+if __name__ == '__main__':
+    handlers = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    asyncio.run(main(handlers, requests))
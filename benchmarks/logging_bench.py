@@ -0,0 +1,78 @@
+"""Бенчмарк конвейера логирования.
+
+Сравнивает задержку вызова logger.info в обработчике, похожем на
+clone_repository (около 10 записей за вызов): прямые FileHandler/StreamHandler
+и очередь с потоком-слушателем, пишущим пачками. Между вызовами обработчик
+ждет pause_ms, как при ожидании сети или git.
+
+Запуск: python -m benchmarks.logging_bench [calls] [lines_per_call] [pause_ms]
+"""
+import os
+import sys
+import time
+import queue
+import logging
+import tempfile
+from logging.handlers import RotatingFileHandler
+from utils.log_pipeline import (
+    BatchingQueueListener, BatchRotatingFileHandler, BatchStreamHandler, DroppingQueueHandler
+)
+
+FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+def _handler_calls(logger: logging.Logger, calls: int, lines: int, pause: float) -> list:
+    latencies = []
+    for i in range(calls):
+        time.sleep(pause)
+        started = time.perf_counter()
+        for line in range(lines):
+            logger.info(f"Clone step {line} for project bench_{i}: /projects/bench_{i}")
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+def _report(name: str, latencies: list, lines: int):
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1e6
+    p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+    print(f"{name:22} p50 {p50:8.1f} us  p99 {p99:8.1f} us  ({p50 / lines:6.2f} us/line)")
+
+def main(calls: int, lines: int, pause: float):
+    formatter = logging.Formatter(FORMAT)
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, 'w') as devnull:
+        # Прямые обработчики, как в исходном setup_logging
+        logger = logging.getLogger('bench.direct')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        direct = [logging.StreamHandler(devnull), RotatingFileHandler(os.path.join(tmp, 'direct.log'), maxBytes=50 * 1024 * 1024)]
+        for handler in direct:
+            handler.setFormatter(formatter)
+            logger.addHandler(handler)
+        _report('direct handlers', _handler_calls(logger, calls, lines, pause), lines)
+        for handler in direct:
+            handler.close()
+
+        # Очередь и слушатель с пакетной записью
+        logger = logging.getLogger('bench.queued')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        handlers = [BatchStreamHandler(devnull), BatchRotatingFileHandler(os.path.join(tmp, 'queued.log'), maxBytes=50 * 1024 * 1024)]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        log_queue = queue.Queue(maxsize=10000)
+        queue_handler = DroppingQueueHandler(log_queue)
+        listener = BatchingQueueListener(log_queue, *handlers, queue_handler=queue_handler)
+        logger.addHandler(queue_handler)
+        listener.start()
+        latencies = _handler_calls(logger, calls, lines, pause)
+        drain_started = time.perf_counter()
+        listener.stop()
+        _report('queue + listener', latencies, lines)
+        print(f"drain after run: {(time.perf_counter() - drain_started) * 1000:.1f} ms, dropped: {queue_handler.dropped}")
+        for handler in handlers:
+            handler.close()
+
+if __name__ == '__main__':
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    pause_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+    main(calls, lines, pause_ms / 1000)
@@ -3,14 +3,28 @@ from telebot.types import Message, CallbackQuery
 from config.config import Config
 from core.project_manager import ProjectManager
 from core.docker_monitor import DockerMonitor
+from core.metrics_store import sparkline
 from utils.error_handler import ErrorHandler
+from utils.fs import tail_lines
+from database.log_store import LogStore, bind_project
 from .keyboard import Keyboard
+from .live_message import LiveMessage, MAX_MESSAGE_LENGTH
 from core.version_manager import VersionManager
 from core.test_environment import TestEnvironment
+from core.container_pool import ContainerPool
+from core.image_cache import ImageCache
+import os
+import time
+import asyncio
 import logging
+from datetime import datetime
 
 logger = logging.getLogger('handlers')
 
+# Версий на странице списка и длина сообщения коммита в нем
+VERSIONS_PAGE_SIZE = 10
+VERSION_MESSAGE_LENGTH = 200
+
 class BotHandlers:
     def __init__(
         self,
@@ -18,14 +32,22 @@ class BotHandlers:
         config: Config,
         project_manager: ProjectManager,
         docker_monitor: DockerMonitor,
-        error_handler: ErrorHandler
+        error_handler: ErrorHandler,
+        container_pool: ContainerPool = None,
+        image_cache: ImageCache = None,
+        log_store: LogStore = None
     ):
         self.bot = bot
         self.config = config
         self.project_manager = project_manager
         self.docker_monitor = docker_monitor
         self.error_handler = error_handler
+        self.container_pool = container_pool
+        self.image_cache = image_cache
+        self.log_store = log_store
         self.keyboard = Keyboard()
+        # Путь к полному логу последнего тестового прогона по проектам
+        self.test_logs = {}
         
         self.register_handlers()
         
@@ -34,6 +56,7 @@ class BotHandlers:
         # Команды
         self.bot.message_handler(commands=['start'])(self.handle_start)
         self.bot.message_handler(commands=['help'])(self.handle_help)
+        self.bot.message_handler(commands=['logs'])(self.handle_logs_query)
         
         # Важно: регистрируем обработчик текстовых сообщений
         self.bot.message_handler(content_types=['text'])(self.handle_message)
@@ -85,6 +108,7 @@ class BotHandlers:
 Основные команды:
 /start - Начать работу
 /help - Показать эту справку
+/logs - Поиск по логам: `/logs project=1 level=error since=2h until=30m текст`
 
 Возможности:
 • Добавление и управление проектами
@@ -125,14 +149,20 @@ class BotHandlers:
                 await self.handle_intervals(call, user)
             elif call.data == "deploy":
                 await self.handle_deploy(call, user)
+            elif call.data.startswith('project_'):
+                await self.handle_deploy_project(call, user)
             elif call.data == "stats":
                 await self.handle_stats(call, user)
+            elif call.data.startswith('metrics_'):
+                await self.handle_metrics(call, user)
             elif call.data.startswith('versions_'):
                 await self.handle_versions(call, user)
             elif call.data.startswith('rollback_'):
                 await self.handle_rollback(call, user)
             elif call.data.startswith('test_'):
                 await self.handle_test_environment(call, user)
+            elif call.data.startswith('testlog_'):
+                await self.handle_test_log(call, user)
             elif call.data == "back_to_main":
                 await self.bot.edit_message_text(
                     "Главное меню:",
@@ -188,9 +218,15 @@ class BotHandlers:
                 try:
                     name, repo_url, branch = message.text.strip().split('|')
                     
+                    # Проекты принадлежат записи users (users.id), а не telegram id
+                    user = await self.project_manager.db.get_user(str(message.from_user.id))
+                    if not user:
+                        await self.bot.reply_to(message, "Пожалуйста, начните с команды /start")
+                        return
+                    
                     # Создаем проект
                     project = await self.project_manager.create_project(
-                        user_id=message.from_user.id,
+                        user_id=user.id,
                         name=name.strip(),
                         repo_url=repo_url.strip(),
                         branch=branch.strip()
@@ -198,9 +234,16 @@ class BotHandlers:
                     
                     # Клонируем репозиторий
                     if await self.project_manager.clone_repository(project):
+                        reply = f"✅ Проект {name} успешно добавлен и склонирован"
+                        stats = self.project_manager.clone_stats.get(project.name)
+                        if stats:
+                            reply += (
+                                f"\n⏱ {stats['clone_time']} сек, "
+                                f"💾 {stats['disk_usage'] / (1024*1024):.2f}MB"
+                            )
                         await self.bot.reply_to(
                             message,
-                            f"✅ Проект {name} успешно добавлен и склонирован",
+                            reply,
                             reply_markup=self.keyboard.main_menu()
                         )
                     else:
@@ -245,17 +288,19 @@ class BotHandlers:
                     f"CPU: {stats['cpu_percent']}%\n"
                     f"RAM: {stats['memory_percent']}%\n"
                     f"Использовано: {stats['memory_usage']}\n"
-                    f"Всего: {stats['memory_limit']}"
+                    f"Всего: {stats['memory_limit']}\n\n"
+                    f"_Обновлено {stats['age']} сек назад_"
                 )
             else:
-                stats_text = "❌ Не удалось получить статистику"
+                stats_text = "⏳ Статистика еще собирается, попробуйте позже"
+            stats_text += await self._projects_dashboard()
             
             await self.bot.edit_message_text(
                 stats_text,
                 call.message.chat.id,
                 call.message.message_id,
                 parse_mode='Markdown',
-                reply_markup=self.keyboard.main_menu()
+                reply_markup=self.keyboard.metrics_menu('bot')
             )
         except Exception as e:
             logger.error(f"Error in handle_stats: {str(e)}")
@@ -264,39 +309,166 @@ class BotHandlers:
                 "❌ Ошибка при получении статистики"
             )
         
+    async def _projects_dashboard(self, max_length: int = 3000) -> str:
+        """Сводка по контейнерам и процессам проектов из последнего опроса"""
+        dashboard = self.docker_monitor.get_dashboard()
+        if not dashboard['containers']:
+            return ""
+        
+        names = {project.id: project.name for project in await self.project_manager.get_all_projects()}
+        lines = [
+            f"\n\n*📦 Запущенные проекты ({dashboard['containers']})*",
+            f"Всего CPU: {dashboard['cpu_percent']}%, RAM: {dashboard['memory_usage'] / (1024*1024):.0f}MB",
+            f"_Опрос занял {dashboard['sweep_duration']} сек_\n"
+        ]
+        length = sum(len(line) + 1 for line in lines)
+        for shown, row in enumerate(dashboard['rows']):
+            sample = row['sample']
+            name = names.get(row['project_id'], f"#{row['project_id']}")
+            line = (
+                f"• {name}: CPU {sample.cpu_percent:.1f}%, "
+                f"RAM {sample.memory_usage / (1024*1024):.0f}MB ({sample.memory_percent:.1f}%)"
+            )
+            if length + len(line) > max_length:
+                lines.append(f"...и еще {len(dashboard['rows']) - shown}")
+                break
+            lines.append(line)
+            length += len(line) + 1
+        return '\n'.join(lines)
+
+    @ErrorHandler.handle_error
+    async def handle_metrics(self, call: CallbackQuery, user):
+        """История CPU/памяти за час или сутки"""
+        try:
+            _, target, window = call.data.split('_')
+            metrics = self.docker_monitor.metrics if self.docker_monitor else None
+            if not metrics:
+                await self.bot.answer_callback_query(
+                    call.id,
+                    "⚠️ Мониторинг Docker отключен"
+                )
+                return
+            
+            if target == 'bot':
+                title, key = "Бот", "cicd_bot"
+            else:
+                project = await self.project_manager.get_project(int(target))
+                title, key = (project.name if project else f"#{target}"), f"project:{target}"
+            
+            period, seconds = ("сутки", 86400) if window == 'day' else ("час", 3600)
+            summary = metrics.summary(key, seconds)
+            if not summary:
+                text = f"📈 *Метрики: {title}* ({period})\n\nНет данных за этот период"
+            else:
+                mb = 1024 * 1024
+                text = (
+                    f"📈 *Метрики: {title}* ({period}, шаг {summary['resolution']} сек)\n\n"
+                    "```\n"
+                    f"CPU {sparkline(summary['cpu_series'])}\n"
+                    f"    min {summary['cpu_min']:.1f}% / avg {summary['cpu_avg']:.1f}% / "
+                    f"max {summary['cpu_max']:.1f}%\n"
+                    f"RAM {sparkline(summary['mem_series'])}\n"
+                    f"    min {summary['mem_min'] / mb:.0f}MB / avg {summary['mem_avg'] / mb:.0f}MB / "
+                    f"max {summary['mem_max'] / mb:.0f}MB\n"
+                    "```"
+                )
+            
+            await self.bot.edit_message_text(
+                text,
+                call.message.chat.id,
+                call.message.message_id,
+                parse_mode='Markdown',
+                reply_markup=self.keyboard.metrics_menu(target)
+            )
+        except Exception as e:
+            logger.error(f"Error in handle_metrics: {str(e)}")
+            await self.bot.answer_callback_query(
+                call.id,
+                "❌ Ошибка при получении метрик"
+            )
+
+    @staticmethod
+    def _version_entry(version) -> str:
+        """Блок одной версии: первая строка сообщения, обрезанная и экранированная для Markdown"""
+        lines = version.commit_message.splitlines()
+        message = lines[0] if lines else ''
+        if len(message) > VERSION_MESSAGE_LENGTH:
+            message = message[:VERSION_MESSAGE_LENGTH - 1] + '…'
+        for char in ('_', '*', '`', '['):
+            message = message.replace(char, '\\' + char)
+        return (
+            f"*Версия {version.version_number}*\n"
+            f"Дата: {version.commit_date}\n"
+            f"Сообщение: {message}\n"
+            f"Хэш: `{version.commit_hash[:8]}`\n\n"
+        )
+
     @ErrorHandler.handle_error
     async def handle_versions(self, call: CallbackQuery, user):
-        """Обработка запроса версий проекта"""
+        """Обработка запроса версий проекта.
+
+        versions_<id> - самые новые версии, versions_<id>_b<N> - страница
+        старее версии N, versions_<id>_a<N> - страница новее версии N.
+        """
         try:
-            project_id = int(call.data.split('_')[1])
+            parts = call.data.split('_')
+            project_id = int(parts[1])
+            bind_project(project_id)
+            before_version = after_version = None
+            if len(parts) > 2 and parts[2][1:].isdigit():
+                cursor = int(parts[2][1:])
+                if parts[2][0] == 'a':
+                    after_version = cursor
+                else:
+                    before_version = cursor
             project = await self.project_manager.get_project(project_id)
             
-            version_manager = VersionManager(project.project_path)
-            versions = version_manager.get_versions()
+            version_manager = VersionManager(
+                project, self.project_manager.commit_index, self.project_manager.git, self.project_manager
+            )
+            versions = await version_manager.get_versions(VERSIONS_PAGE_SIZE, before_version, after_version)
             
             if not versions:
                 await self.bot.edit_message_text(
                     "❌ Версии не найдены",
                     call.message.chat.id,
-                    call.message.message_id
+                    call.message.message_id,
+                    reply_markup=self.keyboard.versions_menu(project_id)
                 )
                 return
             
-            versions_text = "*📋 Доступные версии:*\n\n"
-            for version in versions:
-                versions_text += (
-                    f"*Версия {version.version_number}*\n"
-                    f"Дата: {version.commit_date}\n"
-                    f"Сообщение: {version.commit_message}\n"
-                    f"Хэш: `{version.commit_hash[:8]}`\n\n"
-                )
+            # Страница ограничена размером сообщения: при переходе к старым версиям
+            # отбрасываются самые старые записи, к новым - самые новые
+            header = "*📋 Доступные версии:*\n\n"
+            entries = [self._version_entry(version) for version in versions]
+            size = len(header)
+            fitted = []
+            ordered = list(zip(versions, entries))
+            if after_version is not None:
+                ordered.reverse()
+            for version, entry in ordered:
+                if fitted and size + len(entry) > MAX_MESSAGE_LENGTH:
+                    break
+                fitted.append((version, entry))
+                size += len(entry)
+            if after_version is not None:
+                fitted.reverse()
+
+            newest = fitted[0][0].version_number
+            oldest = fitted[-1][0].version_number
+            latest = await version_manager.latest_version()
+            versions_text = header + ''.join(entry for _, entry in fitted)
             
             await self.bot.edit_message_text(
                 versions_text,
                 call.message.chat.id,
                 call.message.message_id,
                 parse_mode='Markdown',
-                reply_markup=self.keyboard.versions_menu(project_id)
+                reply_markup=self.keyboard.versions_menu(
+                    project_id,
+                    newer_than=newest if latest and newest < latest else None,
+                    older_than=oldest if oldest > 1 else None
+                )
             )
             
         except Exception as e:
@@ -313,9 +485,12 @@ class BotHandlers:
             _, project_id, version = call.data.split('_')
             project_id = int(project_id)
             version = int(version)
+            bind_project(project_id)
             
             project = await self.project_manager.get_project(project_id)
-            version_manager = VersionManager(project.project_path)
+            version_manager = VersionManager(
+                project, self.project_manager.commit_index, self.project_manager.git, self.project_manager
+            )
             
             success, message = await version_manager.rollback_to_version(version)
             
@@ -344,16 +519,22 @@ class BotHandlers:
         """Обработка запуска тестового окружения"""
         try:
             project_id = int(call.data.split('_')[1])
+            bind_project(project_id)
             project = await self.project_manager.get_project(project_id)
             
             # Получаем тестовые переменные окружения
             test_config = await self.project_manager.get_test_config(project_id)
             
             # Создаем тестовое окружение
-            test_env = TestEnvironment(project.project_path, test_config)
+            test_env = TestEnvironment(
+                project.project_path,
+                test_config,
+                self.container_pool,
+                self.image_cache
+            )
             
-            # Настраиваем окружение
-            success, message = await test_env.setup()
+            # Настраиваем окружение (таймаут тестов покрывает и подготовку)
+            success, message = await test_env.setup(timeout=self.config.test_timeout)
             if not success:
                 await self.bot.answer_callback_query(
                     call.id,
@@ -361,19 +542,38 @@ class BotHandlers:
                 )
                 return
             
-            # Запускаем тесты
-            success, output = await test_env.run_tests()
-            
-            # Очищаем окружение
-            await test_env.cleanup()
+            # Запускаем тесты, показывая вывод по мере выполнения
+            live = LiveMessage(
+                self.bot,
+                call.message.chat.id,
+                call.message.message_id,
+                header=f"🧪 Тестирование {project.name}...",
+                interval=self.config.live_update_interval
+            )
+            await live.start()
+            try:
+                success, output = await test_env.run_tests(
+                    shards=self.config.test_shards,
+                    on_output=live.feed,
+                    timeout=self.config.test_timeout
+                )
+            finally:
+                await live.stop()
+                # Очищаем окружение
+                await test_env.cleanup()
+            self.test_logs[project_id] = test_env.log_path
             
             # Формируем отчет
+            if test_env.timed_out:
+                status = f"⏱ Таймаут ({self.config.test_timeout} сек)"
+            else:
+                status = '✅ Успешно' if success else '❌ Ошибка'
             report = (
                 "📋 *Результаты тестирования*\n\n"
                 f"Проект: {project.name}\n"
-                f"Статус: {'✅ Успешно' if success else '❌ Ошибка'}\n\n"
+                f"Статус: {status}\n\n"
                 "```\n"
-                f"{output[:1000]}...\n"  # Ограничиваем вывод
+                f"...{output[-1000:]}\n"  # Хвост вывода, полный лог доступен по кнопке
                 "```"
             )
             
@@ -382,7 +582,7 @@ class BotHandlers:
                 call.message.chat.id,
                 call.message.message_id,
                 parse_mode='Markdown',
-                reply_markup=self.keyboard.main_menu()
+                reply_markup=self.keyboard.test_result_menu(project_id)
             )
             
         except Exception as e:
@@ -392,6 +592,32 @@ class BotHandlers:
                 "❌ Ошибка при запуске тестового окружения"
             )
 
+    @ErrorHandler.handle_error
+    async def handle_test_log(self, call: CallbackQuery, user):
+        """Отправка полного лога последнего тестового прогона"""
+        try:
+            project_id = int(call.data.split('_')[1])
+            log_path = self.test_logs.get(project_id)
+            if not log_path or not os.path.exists(log_path):
+                await self.bot.answer_callback_query(
+                    call.id,
+                    "❌ Лог не найден"
+                )
+                return
+            
+            with open(log_path, 'rb') as f:
+                await self.bot.send_document(
+                    call.message.chat.id,
+                    f,
+                    visible_file_name=os.path.basename(log_path)
+                )
+        except Exception as e:
+            logger.error(f"Error in handle_test_log: {str(e)}")
+            await self.bot.answer_callback_query(
+                call.id,
+                "❌ Ошибка при отправке лога"
+            )
+
     @ErrorHandler.handle_error
     async def handle_confirmation(self, call: CallbackQuery, user):
         """Обработка подтверждений действий"""
@@ -447,6 +673,45 @@ class BotHandlers:
                 "❌ Ошибка при обработке деплоя"
             )
 
+    @ErrorHandler.handle_error
+    async def handle_deploy_project(self, call: CallbackQuery, user):
+        """Деплой выбранного проекта с выводом шагов сборки по мере выполнения"""
+        try:
+            project_id = int(call.data.split('_')[1])
+            project = await self.project_manager.get_project(project_id)
+            if not project or project.user_id != user.id:
+                await self.bot.answer_callback_query(call.id, "❌ Проект не найден")
+                return
+            bind_project(project_id)
+
+            live = LiveMessage(
+                self.bot,
+                call.message.chat.id,
+                call.message.message_id,
+                header=f"🚀 Деплой {project.name}...",
+                interval=self.config.live_update_interval
+            )
+            await live.start()
+            try:
+                success = await self.project_manager.deploy_project(project, on_output=live.feed)
+            finally:
+                await live.stop()
+
+            status = '✅ Проект развернут' if success else '❌ Ошибка деплоя, подробности в логах'
+            await self.bot.edit_message_text(
+                f"{status}: {project.name}",
+                call.message.chat.id,
+                call.message.message_id,
+                reply_markup=self.keyboard.main_menu()
+            )
+
+        except Exception as e:
+            logger.error(f"Error in handle_deploy_project: {str(e)}")
+            await self.bot.answer_callback_query(
+                call.id,
+                "❌ Ошибка при деплое проекта"
+            )
+
     @ErrorHandler.handle_error
     async def handle_settings(self, call: CallbackQuery, user):
         """Обработка меню настроек"""
@@ -474,8 +739,17 @@ class BotHandlers:
     async def handle_logs(self, call: CallbackQuery, user):
         """Обработка просмотра логов"""
         try:
-            with open('bot.log', 'r') as f:
-                logs = f.readlines()[-self.config.max_log_lines:]
+            # Читаем только хвост файла, не загружая весь лог в память
+            loop = asyncio.get_running_loop()
+            logs = await loop.run_in_executor(
+                None,
+                tail_lines,
+                self.config.log_file,
+                self.config.max_log_lines
+            )
+            # Telegram ограничение: отбрасываем самые старые строки
+            while logs and sum(len(line) for line in logs) > 3900:
+                logs.pop(0)
                 
             log_text = (
                 "*📋 Последние логи:*\n\n"
@@ -485,7 +759,7 @@ class BotHandlers:
             )
             
             await self.bot.edit_message_text(
-                log_text[:4000],  # Telegram ограничение
+                log_text,
                 call.message.chat.id,
                 call.message.message_id,
                 parse_mode='Markdown',
@@ -498,6 +772,81 @@ class BotHandlers:
                 "❌ Ошибка при получении логов"
             )
 
+    @staticmethod
+    def _parse_period(value: str) -> float:
+        """Длительность вида 30s, 15m, 2h, 7d в секундах"""
+        units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+        if value[-1:] in units:
+            return float(value[:-1]) * units[value[-1]]
+        return float(value)
+
+    @ErrorHandler.handle_error
+    async def handle_logs_query(self, message: Message):
+        """Поиск по структурированным логам: /logs project=1 level=error since=2h until=30m текст.
+
+        Доступны только записи проектов пользователя.
+        """
+        try:
+            user = await self.project_manager.db.get_user(str(message.from_user.id))
+            if not user:
+                await self.bot.reply_to(message, "Пожалуйста, начните с команды /start")
+                return
+            if not self.log_store:
+                await self.bot.reply_to(message, "⚠️ Хранилище логов недоступно")
+                return
+            
+            filters = {}
+            words = []
+            now = time.time()
+            for token in message.text.split()[1:]:
+                key, _, value = token.partition('=')
+                if not value:
+                    words.append(token)
+                elif key == 'project':
+                    filters['project_id'] = int(value.lstrip('#'))
+                elif key == 'level':
+                    level = logging.getLevelName(value.upper())
+                    if not isinstance(level, int):
+                        raise ValueError(f"Неизвестный уровень {value}")
+                    filters['level'] = level
+                elif key == 'since':
+                    filters['since'] = now - self._parse_period(value)
+                elif key == 'until':
+                    filters['until'] = now - self._parse_period(value)
+                else:
+                    words.append(token)
+            
+            project_ids = [project.id for project in await self.project_manager.get_projects(user.id)]
+            if filters.get('project_id') is not None and filters['project_id'] not in project_ids:
+                await self.bot.reply_to(message, "❌ Проект не найден")
+                return
+            
+            started = time.perf_counter()
+            records = await self.log_store.query(
+                text=' '.join(words),
+                limit=self.config.max_log_lines,
+                project_ids=project_ids,
+                **filters
+            )
+            elapsed = (time.perf_counter() - started) * 1000
+            
+            header = f"📋 Найдено записей: {len(records)} ({elapsed:.0f} мс)\n\n"
+            lines = [
+                f"{datetime.fromtimestamp(r.timestamp):%d.%m %H:%M:%S} {r.level_name} {r.logger}"
+                f"{f' #{r.project_id}' if r.project_id is not None else ''}: {r.message}"
+                for r in records
+            ]
+            # Telegram ограничение: отбрасываем самые старые записи
+            while lines and len(header) + sum(len(line) + 1 for line in lines) > 4000:
+                lines.pop(0)
+            
+            await self.bot.send_message(message.chat.id, header + '\n'.join(lines))
+        except ValueError as e:
+            await self.bot.reply_to(message, f"❌ Неверный фильтр: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error in handle_logs_query: {str(e)}")
+            await self.bot.reply_to(message, "❌ Ошибка при поиске по логам")
+
     @ErrorHandler.handle_error
     async def handle_intervals(self, call: CallbackQuery, user):
         """Обработка настройки интервалов"""
@@ -1,3 +1,4 @@
+from typing import Optional
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 class Keyboard:
@@ -24,6 +25,18 @@ class Keyboard:
             InlineKeyboardButton("▶️ Запустить", callback_data=f"start_{project_id}"),
             InlineKeyboardButton("🧪 Тесты", callback_data=f"test_{project_id}"),
             InlineKeyboardButton("📋 Версии", callback_data=f"versions_{project_id}"),
+            InlineKeyboardButton("📈 Метрики", callback_data=f"metrics_{project_id}_hour"),
+            InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")
+        )
+        return keyboard
+
+    @staticmethod
+    def metrics_menu(target) -> InlineKeyboardMarkup:
+        """Выбор окна истории метрик (target - id проекта или bot)"""
+        keyboard = InlineKeyboardMarkup(row_width=2)
+        keyboard.add(
+            InlineKeyboardButton("📈 Час", callback_data=f"metrics_{target}_hour"),
+            InlineKeyboardButton("📈 Сутки", callback_data=f"metrics_{target}_day"),
             InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")
         )
         return keyboard
@@ -62,15 +75,33 @@ class Keyboard:
         return keyboard
 
     @staticmethod
-    def versions_menu(project_id: int) -> InlineKeyboardMarkup:
-        """Меню управления версиями"""
+    def versions_menu(project_id: int, newer_than: Optional[int] = None,
+                      older_than: Optional[int] = None) -> InlineKeyboardMarkup:
+        """Меню управления версиями (с переходом к более новым и старым страницам)"""
         keyboard = InlineKeyboardMarkup(row_width=2)
+        pages = []
+        if newer_than is not None:
+            pages.append(InlineKeyboardButton("⬅️ Новее", callback_data=f"versions_{project_id}_a{newer_than}"))
+        if older_than is not None:
+            pages.append(InlineKeyboardButton("Старее ➡️", callback_data=f"versions_{project_id}_b{older_than}"))
+        if pages:
+            keyboard.row(*pages)
         keyboard.add(
             InlineKeyboardButton("🔄 Обновить список", callback_data=f"versions_{project_id}"),
             InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")
         )
         return keyboard
 
+    @staticmethod
+    def test_result_menu(project_id: int) -> InlineKeyboardMarkup:
+        """Меню после тестового прогона"""
+        keyboard = InlineKeyboardMarkup(row_width=2)
+        keyboard.add(
+            InlineKeyboardButton("📄 Полный лог", callback_data=f"testlog_{project_id}"),
+            InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")
+        )
+        return keyboard
+
     def rollback_menu(self, project_id: int, versions: list) -> InlineKeyboardMarkup:
         """Меню выбора версии для отката"""
         keyboard = InlineKeyboardMarkup(row_width=2)
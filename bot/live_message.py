@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from typing import Optional
+
+logger = logging.getLogger('live_message')
+
+# Ограничение Telegram на длину сообщения
+MAX_MESSAGE_LENGTH = 4096
+
+class LiveMessage:
+    """Сообщение со статусом, обновляемое не чаще одного раза в interval секунд.
+
+    Вывод между обновлениями накапливается, в сообщение попадает только хвост.
+    """
+
+    def __init__(self, bot, chat_id: int, message_id: int, header: str = '',
+                 interval: float = 3.0, tail_chars: int = 3500):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.header = header
+        self.interval = interval
+        self.tail_chars = tail_chars
+        self._tail = ''
+        self._dirty = False
+        self._last_text: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def feed(self, stream: str, text: str):
+        """Добавление вывода (без обращения к Telegram).
+
+        Сигнатура OutputCallback: stdout и stderr показываются вместе.
+        """
+        self._tail = (self._tail + text)[-self.tail_chars:]
+        self._dirty = True
+
+    async def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self._dirty:
+                await self._flush()
+
+    async def _flush(self):
+        self._dirty = False
+        text = f"{self.header}\n\n{self._tail}"[:MAX_MESSAGE_LENGTH]
+        if text == self._last_text:
+            return
+        try:
+            await self.bot.edit_message_text(text, self.chat_id, self.message_id)
+            self._last_text = text
+        except Exception as e:
+            if getattr(e, 'error_code', None) == 429:
+                # Flood control: ждем столько, сколько просит Telegram
+                parameters = (getattr(e, 'result_json', None) or {}).get('parameters', {})
+                await asyncio.sleep(parameters.get('retry_after', self.interval))
+                self._dirty = True
+            elif 'message is not modified' in str(e):
+                self._last_text = text
+            else:
+                logger.warning(f"Error updating live message: {str(e)}")
@@ -19,6 +19,38 @@ class Config:
     max_log_lines: int
     test_mode: bool
     test_timeout: int
+    max_concurrent_checks: int
+    git_workers: int
+    git_timeout: int
+    user_cache_size: int
+    user_cache_ttl: int
+    state_flush_interval_ms: int
+    state_flush_max_rows: int
+    clone_depth: int
+    clone_filter: str
+    git_cache_dir: Optional[str]
+    venv_cache_dir: Optional[str]
+    venv_cache_max_mb: int
+    deploy_step_timeout: int
+    test_base_image: str
+    test_pool_size: int
+    test_pool_idle_timeout: int
+    test_image_budget_mb: int
+    test_shards: int
+    live_update_interval: float
+    stats_interval: float
+    stats_history_size: int
+    stats_max_concurrency: int
+    stats_discovery_interval: int
+    metrics_persist_interval: int
+    log_file: str
+    log_max_mb: int
+    log_backup_count: int
+    log_db_path: Optional[str]
+    log_retention_days: int
+    log_queue_size: int
+    log_batch_size: int
+    releases_keep: int
     http_proxy: Optional[str]
     https_proxy: Optional[str]
 
@@ -53,6 +85,162 @@ class Config:
                 logger.warning("Invalid TEST_TIMEOUT, using default 300")
                 test_timeout = 300
 
+            try:
+                max_concurrent_checks = int(os.getenv('MAX_CONCURRENT_CHECKS', '10').strip())
+            except ValueError:
+                logger.warning("Invalid MAX_CONCURRENT_CHECKS, using default 10")
+                max_concurrent_checks = 10
+
+            try:
+                git_workers = int(os.getenv('GIT_WORKERS', '4').strip())
+            except ValueError:
+                logger.warning("Invalid GIT_WORKERS, using default 4")
+                git_workers = 4
+
+            try:
+                git_timeout = int(os.getenv('GIT_TIMEOUT', '300').strip())
+            except ValueError:
+                logger.warning("Invalid GIT_TIMEOUT, using default 300")
+                git_timeout = 300
+
+            try:
+                user_cache_size = int(os.getenv('USER_CACHE_SIZE', '1024').strip())
+            except ValueError:
+                logger.warning("Invalid USER_CACHE_SIZE, using default 1024")
+                user_cache_size = 1024
+
+            try:
+                user_cache_ttl = int(os.getenv('USER_CACHE_TTL', '300').strip())
+            except ValueError:
+                logger.warning("Invalid USER_CACHE_TTL, using default 300")
+                user_cache_ttl = 300
+
+            try:
+                state_flush_interval_ms = int(os.getenv('STATE_FLUSH_INTERVAL_MS', '500').strip())
+            except ValueError:
+                logger.warning("Invalid STATE_FLUSH_INTERVAL_MS, using default 500")
+                state_flush_interval_ms = 500
+
+            try:
+                state_flush_max_rows = int(os.getenv('STATE_FLUSH_MAX_ROWS', '500').strip())
+            except ValueError:
+                logger.warning("Invalid STATE_FLUSH_MAX_ROWS, using default 500")
+                state_flush_max_rows = 500
+
+            try:
+                clone_depth = int(os.getenv('CLONE_DEPTH', '0').strip())
+            except ValueError:
+                logger.warning("Invalid CLONE_DEPTH, using default 0")
+                clone_depth = 0
+
+            try:
+                venv_cache_max_mb = int(os.getenv('VENV_CACHE_MAX_MB', '5120').strip())
+            except ValueError:
+                logger.warning("Invalid VENV_CACHE_MAX_MB, using default 5120")
+                venv_cache_max_mb = 5120
+
+            try:
+                deploy_step_timeout = int(os.getenv('DEPLOY_STEP_TIMEOUT', '600').strip())
+            except ValueError:
+                logger.warning("Invalid DEPLOY_STEP_TIMEOUT, using default 600")
+                deploy_step_timeout = 600
+
+            try:
+                test_pool_size = int(os.getenv('TEST_POOL_SIZE', '2').strip())
+            except ValueError:
+                logger.warning("Invalid TEST_POOL_SIZE, using default 2")
+                test_pool_size = 2
+
+            try:
+                test_pool_idle_timeout = int(os.getenv('TEST_POOL_IDLE_TIMEOUT', '600').strip())
+            except ValueError:
+                logger.warning("Invalid TEST_POOL_IDLE_TIMEOUT, using default 600")
+                test_pool_idle_timeout = 600
+
+            try:
+                test_image_budget_mb = int(os.getenv('TEST_IMAGE_BUDGET_MB', '4096').strip())
+            except ValueError:
+                logger.warning("Invalid TEST_IMAGE_BUDGET_MB, using default 4096")
+                test_image_budget_mb = 4096
+
+            try:
+                test_shards = int(os.getenv('TEST_SHARDS', '1').strip())
+            except ValueError:
+                logger.warning("Invalid TEST_SHARDS, using default 1")
+                test_shards = 1
+
+            try:
+                live_update_interval = float(os.getenv('LIVE_UPDATE_INTERVAL', '3').strip())
+            except ValueError:
+                logger.warning("Invalid LIVE_UPDATE_INTERVAL, using default 3")
+                live_update_interval = 3.0
+
+            try:
+                stats_interval = float(os.getenv('STATS_INTERVAL', '5').strip())
+            except ValueError:
+                logger.warning("Invalid STATS_INTERVAL, using default 5")
+                stats_interval = 5.0
+
+            try:
+                stats_history_size = int(os.getenv('STATS_HISTORY_SIZE', '120').strip())
+            except ValueError:
+                logger.warning("Invalid STATS_HISTORY_SIZE, using default 120")
+                stats_history_size = 120
+
+            try:
+                stats_max_concurrency = int(os.getenv('STATS_MAX_CONCURRENCY', '16').strip())
+            except ValueError:
+                logger.warning("Invalid STATS_MAX_CONCURRENCY, using default 16")
+                stats_max_concurrency = 16
+
+            try:
+                stats_discovery_interval = int(os.getenv('STATS_DISCOVERY_INTERVAL', '60').strip())
+            except ValueError:
+                logger.warning("Invalid STATS_DISCOVERY_INTERVAL, using default 60")
+                stats_discovery_interval = 60
+
+            try:
+                metrics_persist_interval = int(os.getenv('METRICS_PERSIST_INTERVAL', '60').strip())
+            except ValueError:
+                logger.warning("Invalid METRICS_PERSIST_INTERVAL, using default 60")
+                metrics_persist_interval = 60
+
+            try:
+                log_max_mb = int(os.getenv('LOG_MAX_MB', '10').strip())
+            except ValueError:
+                logger.warning("Invalid LOG_MAX_MB, using default 10")
+                log_max_mb = 10
+
+            try:
+                log_backup_count = int(os.getenv('LOG_BACKUP_COUNT', '5').strip())
+            except ValueError:
+                logger.warning("Invalid LOG_BACKUP_COUNT, using default 5")
+                log_backup_count = 5
+
+            try:
+                log_retention_days = int(os.getenv('LOG_RETENTION_DAYS', '14').strip())
+            except ValueError:
+                logger.warning("Invalid LOG_RETENTION_DAYS, using default 14")
+                log_retention_days = 14
+
+            try:
+                log_queue_size = int(os.getenv('LOG_QUEUE_SIZE', '10000').strip())
+            except ValueError:
+                logger.warning("Invalid LOG_QUEUE_SIZE, using default 10000")
+                log_queue_size = 10000
+
+            try:
+                log_batch_size = int(os.getenv('LOG_BATCH_SIZE', '500').strip())
+            except ValueError:
+                logger.warning("Invalid LOG_BATCH_SIZE, using default 500")
+                log_batch_size = 500
+
+            try:
+                releases_keep = int(os.getenv('RELEASES_KEEP', '3').strip())
+            except ValueError:
+                logger.warning("Invalid RELEASES_KEEP, using default 3")
+                releases_keep = 3
+
             # Безопасное преобразование строки в boolean
             test_mode = os.getenv('TEST_MODE', 'False').strip().lower() in ['true', '1', 'yes']
 
@@ -67,6 +255,38 @@ class Config:
                 max_log_lines=max_log_lines,
                 test_mode=test_mode,
                 test_timeout=test_timeout,
+                max_concurrent_checks=max_concurrent_checks,
+                git_workers=git_workers,
+                git_timeout=git_timeout,
+                user_cache_size=user_cache_size,
+                user_cache_ttl=user_cache_ttl,
+                state_flush_interval_ms=state_flush_interval_ms,
+                state_flush_max_rows=state_flush_max_rows,
+                clone_depth=clone_depth,
+                clone_filter=os.getenv('CLONE_FILTER', '').strip(),
+                git_cache_dir=os.getenv('GIT_CACHE_DIR') or None,
+                venv_cache_dir=os.getenv('VENV_CACHE_DIR') or None,
+                venv_cache_max_mb=venv_cache_max_mb,
+                deploy_step_timeout=deploy_step_timeout,
+                test_base_image=os.getenv('TEST_BASE_IMAGE', 'python:3.9-slim'),
+                test_pool_size=test_pool_size,
+                test_pool_idle_timeout=test_pool_idle_timeout,
+                test_image_budget_mb=test_image_budget_mb,
+                test_shards=test_shards,
+                live_update_interval=live_update_interval,
+                stats_interval=stats_interval,
+                stats_history_size=stats_history_size,
+                stats_max_concurrency=stats_max_concurrency,
+                stats_discovery_interval=stats_discovery_interval,
+                metrics_persist_interval=metrics_persist_interval,
+                log_file=os.getenv('LOG_FILE', 'bot.log'),
+                log_max_mb=log_max_mb,
+                log_backup_count=log_backup_count,
+                log_db_path=os.getenv('LOG_DB_PATH') or None,
+                log_retention_days=log_retention_days,
+                log_queue_size=log_queue_size,
+                log_batch_size=log_batch_size,
+                releases_keep=releases_keep,
                 http_proxy=os.getenv('HTTP_PROXY'),
                 https_proxy=os.getenv('HTTPS_PROXY')
             )
@@ -84,6 +304,38 @@ class Config:
                 max_log_lines=30,
                 test_mode=False,
                 test_timeout=300,
+                max_concurrent_checks=10,
+                git_workers=4,
+                git_timeout=300,
+                user_cache_size=1024,
+                user_cache_ttl=300,
+                state_flush_interval_ms=500,
+                state_flush_max_rows=500,
+                clone_depth=0,
+                clone_filter='',
+                git_cache_dir=None,
+                venv_cache_dir=None,
+                venv_cache_max_mb=5120,
+                deploy_step_timeout=600,
+                test_base_image='python:3.9-slim',
+                test_pool_size=2,
+                test_pool_idle_timeout=600,
+                test_image_budget_mb=4096,
+                test_shards=1,
+                live_update_interval=3.0,
+                stats_interval=5.0,
+                stats_history_size=120,
+                stats_max_concurrency=16,
+                stats_discovery_interval=60,
+                metrics_persist_interval=60,
+                log_file='bot.log',
+                log_max_mb=10,
+                log_backup_count=5,
+                log_db_path=None,
+                log_retention_days=14,
+                log_queue_size=10000,
+                log_batch_size=500,
+                releases_keep=3,
                 http_proxy=None,
                 https_proxy=None
             )
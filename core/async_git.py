@@ -0,0 +1,179 @@
+import os
+import asyncio
+import functools
+import git
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, TypeVar
+
+logger = logging.getLogger('async_git')
+
+T = TypeVar('T')
+
+class AsyncGit:
+    """Асинхронный слой над GitPython.
+
+    Все блокирующие git-операции выполняются в ограниченном пуле потоков,
+    операции над одним репозиторием сериализуются, у каждой есть таймаут.
+    """
+
+    def __init__(self, max_workers: int = 4, timeout: int = 300):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='git')
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _lock(self, path: str) -> asyncio.Lock:
+        key = os.path.abspath(path)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    async def run(self, path: str, func: Callable[..., T], *args, timeout: Optional[int] = None, **kwargs) -> T:
+        """Выполнение функции в пуле под блокировкой репозитория path.
+
+        При таймауте вызывающий получает TimeoutError сразу, но блокировка
+        держится до фактического завершения функции в потоке пула, чтобы
+        следующая операция не столкнулась с незавершенной (index.lock).
+        """
+        timeout = timeout or self.timeout
+        lock = self._lock(path)
+        await lock.acquire()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        try:
+            # shield: отмена ожидания не помечает future завершенной, пока поток работает
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Git operation timed out after {timeout}s: {path}")
+            raise TimeoutError(f"Git operation timed out after {timeout}s")
+        finally:
+            if future.done():
+                lock.release()
+            else:
+                future.add_done_callback(lambda done: self._release_late(lock, done, path))
+
+    @staticmethod
+    def _release_late(lock: asyncio.Lock, future: asyncio.Future, path: str):
+        if not future.cancelled() and future.exception():
+            logger.warning(f"Timed out git operation failed: {path}: {str(future.exception())}")
+        lock.release()
+
+    async def git(self, path: str, *args: str, timeout: Optional[int] = None) -> str:
+        """Выполнение git-команды в рабочей директории path"""
+        timeout = timeout or self.timeout
+        command = ['git', *args]
+        # kill_after_timeout завершает сам процесс git, чтобы поток пула не зависал
+        return await self.run(
+            path,
+            git.Git(path).execute,
+            command,
+            kill_after_timeout=timeout,
+            timeout=timeout
+        )
+
+    async def clone(self, repo_url: str, path: str, branch: Optional[str] = None,
+                    depth: Optional[int] = None, filter_spec: Optional[str] = None,
+                    reference: Optional[str] = None, timeout: Optional[int] = None) -> str:
+        """Клонирование репозитория в path.
+
+        depth - поверхностный клон, filter_spec - частичный клон (например blob:none),
+        reference - общее хранилище объектов, подключаемое через alternates.
+        """
+        timeout = timeout or self.timeout
+        parent = os.path.dirname(os.path.abspath(path))
+        command = ['git', 'clone']
+        if branch:
+            command += ['--branch', branch]
+        if depth:
+            command += ['--depth', str(depth)]
+        if filter_spec:
+            command += ['--filter', filter_spec]
+        if reference:
+            command += ['--reference-if-able', reference]
+        command += [repo_url, path]
+        return await self.run(
+            path,
+            git.Git(parent).execute,
+            command,
+            kill_after_timeout=timeout,
+            timeout=timeout
+        )
+
+    async def update_reference(self, repo_url: str, path: str, timeout: Optional[int] = None) -> str:
+        """Создание или обновление общего bare-хранилища объектов для repo_url.
+
+        Клоны с --reference-if-able читают объекты хранилища через alternates,
+        поэтому в нем отключены автоматический gc и удаление недостижимых
+        объектов: fetch --prune убирает только ссылки, объекты остаются.
+        """
+        timeout = timeout or self.timeout
+        if os.path.exists(os.path.join(path, 'HEAD')):
+            await self._pin_objects(path)
+            return await self.git(path, 'fetch', '--prune', 'origin', '+refs/heads/*:refs/heads/*', timeout=timeout)
+
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        output = await self.run(
+            path,
+            git.Git(parent).execute,
+            ['git', 'clone', '--bare', repo_url, path],
+            kill_after_timeout=timeout,
+            timeout=timeout
+        )
+        await self._pin_objects(path)
+        return output
+
+    async def _pin_objects(self, path: str):
+        await self.git(path, 'config', 'gc.auto', '0')
+        await self.git(path, 'config', 'gc.pruneExpire', 'never')
+
+    async def fetch(self, path: str, *refspecs: str, remote: str = 'origin') -> str:
+        return await self.git(path, 'fetch', remote, *refspecs)
+
+    async def ls_remote(self, path: str, branch: str, remote: str = 'origin') -> Optional[str]:
+        """Хэш вершины ветки на удаленном репозитории без загрузки объектов"""
+        output = await self.git(path, 'ls-remote', remote, f'refs/heads/{branch}')
+        for line in output.splitlines():
+            commit, _, ref = line.partition('\t')
+            if ref == f'refs/heads/{branch}':
+                return commit
+        return None
+
+    async def pull(self, path: str) -> str:
+        return await self.git(path, 'pull')
+
+    async def rev_parse(self, path: str, ref: str = 'HEAD') -> str:
+        return (await self.git(path, 'rev-parse', ref)).strip()
+
+    async def checkout_clean(self, path: str, ref: str) -> None:
+        """Сброс рабочей директории и переключение на ref одной операцией"""
+        def _checkout():
+            repo = git.Repo(path)
+            repo.git.reset('--hard', kill_after_timeout=self.timeout)
+            repo.git.clean('-fd', kill_after_timeout=self.timeout)
+            repo.git.checkout(ref, kill_after_timeout=self.timeout)
+
+        await self.run(path, _checkout)
+
+    async def resync(self, path: str, repo_url: str, branch: str, depth: Optional[int] = None) -> bool:
+        """Инкрементальная синхронизация существующей копии с веткой branch.
+
+        Возвращает False, если в path клон другого репозитория.
+        """
+        def _resync():
+            repo = git.Repo(path)
+            if repo.remotes.origin.url != repo_url:
+                return False
+            fetch_args = ['origin', branch]
+            if depth:
+                fetch_args.insert(0, f'--depth={depth}')
+            repo.git.fetch(*fetch_args, kill_after_timeout=self.timeout)
+            repo.git.checkout('-f', '-B', branch, 'FETCH_HEAD', kill_after_timeout=self.timeout)
+            repo.git.clean('-fd', '-e', 'venv', kill_after_timeout=self.timeout)
+            return True
+
+        return await self.run(path, _resync)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
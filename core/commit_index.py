@@ -0,0 +1,101 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+from database.db_manager import Commit, DatabaseManager, Project
+from core.async_git import AsyncGit
+
+logger = logging.getLogger('commit_index')
+
+# Поля коммита разделены \x1f, коммиты - \x1e (в сообщениях не встречаются)
+LOG_FORMAT = '%H%x1f%cd%x1f%B%x1e'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def parse_log(output: str) -> List[Tuple[str, str, str]]:
+    """Разбор вывода git log в список (hash, message, date)"""
+    commits = []
+    for entry in output.split('\x1e'):
+        entry = entry.strip('\n')
+        if not entry:
+            continue
+        commit_hash, committed_at, message = entry.split('\x1f', 2)
+        commits.append((commit_hash, message.strip(), committed_at))
+    return commits
+
+class CommitIndex:
+    """Индекс истории веток проектов в SQLite.
+
+    Коммиты первой родительской линии ветки получают возрастающие номера
+    версий (1 - самый старый) и дописываются инкрементально, поэтому номер
+    не меняется при новых пушах, а просмотр и откат не обращаются к git.
+    """
+
+    def __init__(self, db: DatabaseManager, async_git: AsyncGit):
+        self.db = db
+        self.git = async_git
+        self._locks: Dict[Tuple[int, str], asyncio.Lock] = {}
+
+    async def _head(self, project: Project) -> Optional[str]:
+        # HEAD может быть откачен на старую версию, поэтому сначала ветка
+        for ref in (f'refs/remotes/origin/{project.branch}', f'refs/heads/{project.branch}', 'HEAD'):
+            try:
+                return await self.git.rev_parse(project.project_path, ref)
+            except Exception:
+                continue
+        return None
+
+    async def _log(self, project: Project, rev_range: str) -> List[Tuple[str, str, str]]:
+        output = await self.git.git(
+            project.project_path,
+            'log', '--first-parent', '--reverse',
+            f'--date=format:{DATE_FORMAT}',
+            f'--format={LOG_FORMAT}',
+            rev_range
+        )
+        return parse_log(output)
+
+    async def update(self, project: Project, head: Optional[str] = None) -> int:
+        """Дописывание новых коммитов ветки до head (по умолчанию - вершина ветки)"""
+        lock = self._locks.setdefault((project.id, project.branch), asyncio.Lock())
+        async with lock:
+            try:
+                head = head or await self._head(project)
+                if not head:
+                    return 0
+                latest = await self.db.get_latest_commit(project.id, project.branch)
+                if latest and latest.commit_hash == head:
+                    return 0
+
+                if latest:
+                    try:
+                        commits = await self._log(project, f'{latest.commit_hash}..{head}')
+                    except Exception:
+                        # Последний известный коммит недоступен (переклонирование, force push):
+                        # уже проиндексированные коммиты будут пропущены при вставке
+                        commits = await self._log(project, head)
+                else:
+                    commits = await self._log(project, head)
+
+                added = await self.db.add_commits(project.id, project.branch, commits)
+                if added:
+                    logger.info(f"Indexed {added} commits of {project.name}/{project.branch}")
+                return added
+
+            except Exception as e:
+                logger.error(f"Error indexing commits of {project.name}: {str(e)}")
+                return 0
+
+    async def versions(self, project: Project, limit: int = 10,
+                       before_version: Optional[int] = None,
+                       after_version: Optional[int] = None) -> List[Commit]:
+        """Версии от новых к старым; пустой индекс строится при первом обращении"""
+        commits = await self.db.get_commits(project.id, project.branch, limit, before_version, after_version)
+        if not commits and before_version is None and after_version is None:
+            if await self.update(project):
+                commits = await self.db.get_commits(project.id, project.branch, limit)
+        return commits
+
+    async def latest(self, project: Project) -> Optional[Commit]:
+        return await self.db.get_latest_commit(project.id, project.branch)
+
+    async def get(self, project: Project, version: int) -> Optional[Commit]:
+        return await self.db.get_commit(project.id, project.branch, version)
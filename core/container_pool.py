@@ -0,0 +1,210 @@
+import time
+import uuid
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+logger = logging.getLogger('container_pool')
+
+POOL_LABEL = 'cicd.sandbox'
+
+@dataclass
+class PooledContainer:
+    container: object
+    image: str
+    # Ключ установленных зависимостей (None - чистый контейнер)
+    deps_key: Optional[str] = None
+    last_used: float = field(default_factory=time.monotonic)
+
+    @property
+    def name(self) -> str:
+        return self.container.name
+
+class ContainerPool:
+    """Пул заранее запущенных песочниц для тестовых прогонов.
+
+    Контейнеры выдаются в аренду, после прогона сбрасываются и возвращаются
+    в пул. Для каждого образа (базового и образов с зависимостями) держится
+    до size контейнеров; образ с зависимостями прогревается после первой
+    аренды. Простаивающие дольше idle_timeout контейнеры удаляет фоновая
+    задача start_eviction. Контейнеры помечены меткой POOL_LABEL, оставшиеся
+    от прошлого запуска удаляет remove_stale.
+    """
+
+    def __init__(self, client, image: str = 'python:3.9-slim', size: int = 2, idle_timeout: int = 600):
+        self.client = client
+        self.image = image
+        self.size = max(0, size)
+        self.idle_timeout = idle_timeout
+        self._idle: List[PooledContainer] = []
+        # Арендованные контейнеры по образам
+        self._leased: Dict[str, int] = {}
+        self._lock = asyncio.Lock()
+        self._tasks = set()
+        self._closed = False
+        self._running = False
+
+    async def _call(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: func(*args, **kwargs))
+
+    async def _start(self, image: str) -> PooledContainer:
+        container = await self._call(
+            self.client.containers.run,
+            image,
+            command=['sh', '-c', 'mkdir -p /app && tail -f /dev/null'],
+            detach=True,
+            name=f"cicd_sandbox_{uuid.uuid4().hex[:12]}",
+            labels={POOL_LABEL: '1'}
+        )
+        logger.info(f"Started sandbox container {container.name} from {image}")
+        return PooledContainer(container=container, image=image)
+
+    async def _remove(self, pooled: PooledContainer):
+        try:
+            await self._call(pooled.container.remove, force=True)
+            logger.info(f"Removed sandbox container {pooled.name}")
+        except Exception as e:
+            logger.warning(f"Error removing sandbox container {pooled.name}: {str(e)}")
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def remove_stale(self) -> int:
+        """Удаление песочниц, оставшихся от предыдущего запуска бота"""
+        try:
+            containers = await self._call(
+                self.client.containers.list,
+                all=True,
+                filters={'label': POOL_LABEL}
+            )
+        except Exception as e:
+            logger.warning(f"Error listing stale sandbox containers: {str(e)}")
+            return 0
+        await asyncio.gather(*(self._remove(PooledContainer(container=c, image='')) for c in containers))
+        if containers:
+            logger.info(f"Removed {len(containers)} stale sandbox containers")
+        return len(containers)
+
+    def _count_idle(self, image: str) -> int:
+        return sum(1 for p in self._idle if p.image == image)
+
+    async def warm_up(self, image: Optional[str] = None):
+        """Дозапуск контейнеров образа до размера пула (с учетом арендованных)"""
+        image = image or self.image
+        if self._closed:
+            return
+        async with self._lock:
+            missing = self.size - self._count_idle(image) - self._leased.get(image, 0)
+        if missing <= 0:
+            return
+        started = await asyncio.gather(*(self._start(image) for _ in range(missing)), return_exceptions=True)
+        late = []
+        async with self._lock:
+            for pooled in started:
+                if isinstance(pooled, Exception):
+                    logger.error(f"Failed to start sandbox container: {str(pooled)}")
+                elif self._closed:
+                    # Пул закрыли, пока контейнер запускался
+                    late.append(pooled)
+                else:
+                    self._idle.append(pooled)
+        for pooled in late:
+            await self._remove(pooled)
+
+    async def acquire(self, image: Optional[str] = None, deps_key: Optional[str] = None) -> PooledContainer:
+        """Аренда контейнера: сначала с теми же зависимостями, затем чистый, иначе новый"""
+        image = image or self.image
+        await self.evict_idle()
+        async with self._lock:
+            candidates = [p for p in self._idle if p.image == image]
+            pooled = next((p for p in candidates if deps_key and p.deps_key == deps_key), None) \
+                or next((p for p in candidates if p.deps_key is None), None)
+            if pooled:
+                self._idle.remove(pooled)
+            self._leased[image] = self._leased.get(image, 0) + 1
+
+        if pooled is None:
+            try:
+                pooled = await self._start(image)
+            except (Exception, asyncio.CancelledError):
+                async with self._lock:
+                    self._leased[image] -= 1
+                raise
+        # Пополняем пул этого образа в фоне
+        self._spawn(self.warm_up(image))
+        return pooled
+
+    async def release(self, pooled: PooledContainer, healthy: bool = True):
+        """Возврат контейнера в пул со сбросом рабочей директории"""
+        async with self._lock:
+            self._leased[pooled.image] -= 1
+
+        if healthy:
+            try:
+                exit_code, _ = await self._call(
+                    pooled.container.exec_run,
+                    ['sh', '-c', 'rm -rf /app /tmp/* && mkdir -p /app']
+                )
+                healthy = exit_code == 0
+            except Exception as e:
+                logger.warning(f"Error resetting sandbox container {pooled.name}: {str(e)}")
+                healthy = False
+
+        if not healthy or self._closed:
+            await self._remove(pooled)
+            return
+
+        pooled.last_used = time.monotonic()
+        async with self._lock:
+            self._idle.append(pooled)
+            # Сверх размера пула образа держим только недавно использованные
+            excess = []
+            while self._count_idle(pooled.image) > self.size:
+                oldest = min((p for p in self._idle if p.image == pooled.image), key=lambda p: p.last_used)
+                self._idle.remove(oldest)
+                excess.append(oldest)
+        for old in excess:
+            await self._remove(old)
+
+    async def evict_idle(self):
+        """Удаление контейнеров, простаивающих дольше idle_timeout"""
+        now = time.monotonic()
+        async with self._lock:
+            expired = [p for p in self._idle if now - p.last_used > self.idle_timeout]
+            self._idle = [p for p in self._idle if p not in expired]
+        for pooled in expired:
+            await self._remove(pooled)
+
+    async def start_eviction(self, interval: float = 60):
+        """Периодическое удаление простаивающих контейнеров в фоне"""
+        self._running = True
+        while self._running:
+            await asyncio.sleep(interval)
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                logger.error(f"Error evicting idle sandbox containers: {str(e)}")
+
+    def stop_eviction(self):
+        self._running = False
+
+    async def close(self):
+        """Удаление простаивающих контейнеров; арендованные удаляются при возврате"""
+        self._closed = True
+        self.stop_eviction()
+        async with self._lock:
+            idle, self._idle = self._idle, []
+        await asyncio.gather(*(self._remove(p) for p in idle))
+
+    def stats(self) -> Dict:
+        return {
+            'idle': len(self._idle),
+            'leased': sum(self._leased.values()),
+            'images': len({p.image for p in self._idle}),
+            'warm': sum(1 for p in self._idle if p.deps_key),
+            'size': self.size
+        }
@@ -1,63 +1,294 @@
+import time
 import docker
 import psutil
-from typing import Dict, Optional
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
 import logging
+from core.metrics_store import MetricsStore
 
 logger = logging.getLogger('docker_monitor')
 
+# Метка контейнеров проектов, значение - id проекта
+PROJECT_LABEL = 'cicd.project'
+
+@dataclass
+class StatsSample:
+    timestamp: float
+    cpu_percent: float
+    memory_usage: int
+    memory_limit: int
+
+    @property
+    def memory_percent(self) -> float:
+        return self.memory_usage / self.memory_limit * 100 if self.memory_limit else 0.0
+
+def cpu_percent(stats: Dict, previous: Optional[Dict] = None) -> Optional[float]:
+    """CPU% как в docker stats: прирост времени контейнера к приросту системного времени.
+
+    previous - предыдущий снимок cpu_stats; без него используется precpu_stats.
+    """
+    cpu_stats = stats.get('cpu_stats') or {}
+    precpu_stats = previous if previous is not None else stats.get('precpu_stats') or {}
+    try:
+        cpu_delta = cpu_stats['cpu_usage']['total_usage'] - precpu_stats['cpu_usage']['total_usage']
+        system_delta = cpu_stats['system_cpu_usage'] - precpu_stats['system_cpu_usage']
+    except KeyError:
+        return None
+    if cpu_delta < 0 or system_delta <= 0:
+        return None
+    online_cpus = cpu_stats.get('online_cpus') \
+        or len(cpu_stats['cpu_usage'].get('percpu_usage') or []) or 1
+    return cpu_delta / system_delta * online_cpus * 100
+
+def memory_usage(stats: Dict) -> int:
+    """Используемая память без страничного кэша (cgroup v1 и v2)"""
+    memory_stats = stats.get('memory_stats') or {}
+    usage = memory_stats.get('usage', 0)
+    details = memory_stats.get('stats') or {}
+    cache = details.get('inactive_file', details.get('total_inactive_file', details.get('cache', 0)))
+    return max(0, usage - cache)
+
 class DockerMonitor:
-    def __init__(self):
+    """Фоновый сбор статистики контейнеров.
+
+    Контейнеры опрашиваются раз в interval секунд, последние history_size
+    замеров каждого хранятся в кольцевом буфере, обработчики читают из памяти.
+    Контейнеры проектов находятся по метке PROJECT_LABEL раз в discovery_interval
+    секунд; одновременно опрашивается не больше max_concurrency контейнеров.
+    Если передан metrics, замеры также пишутся в долговременную историю.
+    Проекты, запущенные процессами на хосте, опрашиваются через psutil по PID
+    из processes (id проекта -> PID) под ключом project:<id>.
+    """
+
+    def __init__(self, containers: Iterable[str] = ('cicd_bot',), interval: float = 5.0,
+                 history_size: int = 120, max_concurrency: int = 16, discovery_interval: float = 60,
+                 metrics: Optional[MetricsStore] = None,
+                 processes: Optional[Callable[[], Dict[int, int]]] = None):
         self.client = None
         try:
             self.client = docker.from_env()
         except Exception as e:
             logger.warning(f"Failed to initialize Docker client: {str(e)}")
+        self.interval = interval
+        self.history_size = history_size
+        self.history: Dict[str, Deque[StatsSample]] = {}
+        # Предыдущие cpu_stats для вычисления прироста между замерами
+        self._previous: Dict[str, Dict] = {}
+        self._containers: Dict[str, object] = {}
+        # Имя контейнера проекта -> id проекта
+        self.projects: Dict[str, int] = {}
+        self.discovery_interval = discovery_interval
+        self._discovered_at = 0.0
+        self.sweep_duration = 0.0
+        self.metrics = metrics
+        self.processes = processes
+        # Процессы проектов по id проекта (psutil считает CPU% между вызовами одного объекта)
+        self._procs: Dict[int, psutil.Process] = {}
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency))
+        self._running = False
+        for name in containers:
+            self.watch(name)
+
+    def watch(self, container_name: str):
+        """Добавление контейнера в опрос"""
+        self.history.setdefault(container_name, deque(maxlen=self.history_size))
+
+    def unwatch(self, container_name: str):
+        self.history.pop(container_name, None)
+        self._previous.pop(container_name, None)
+        self._containers.pop(container_name, None)
+        self.projects.pop(container_name, None)
+
+    def series_key(self, container_name: str) -> str:
+        """Ключ истории: для контейнеров проектов - id проекта, иначе имя контейнера"""
+        project_id = self.projects.get(container_name)
+        return f"project:{project_id}" if project_id is not None else container_name
+
+    def _discover(self) -> Dict[str, object]:
+        """Поиск запущенных контейнеров проектов одним запросом по метке"""
+        containers = self.client.containers.list(filters={'label': PROJECT_LABEL})
+        return {container.name: container for container in containers}
+
+    async def discover(self):
+        """Обновление списка контейнеров проектов"""
+        if not self.client:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            found = await loop.run_in_executor(self.executor, self._discover)
+        except Exception as e:
+            logger.error(f"Error discovering project containers: {str(e)}")
+            return
+        self._discovered_at = time.monotonic()
+
+        for name in [name for name in self.projects if name not in found]:
+            self.unwatch(name)
+        for name, container in found.items():
+            try:
+                project_id = int(container.labels.get(PROJECT_LABEL, ''))
+            except ValueError:
+                logger.warning(f"Container {name} has invalid {PROJECT_LABEL} label")
+                continue
+            self.projects[name] = project_id
+            self._containers[name] = container
+            self.watch(name)
+
+    def _get_container(self, container_name: str):
+        container = self._containers.get(container_name)
+        if container is None:
+            container = self.client.containers.get(container_name)
+            self._containers[container_name] = container
+        return container
+
+    def _sample(self, container_name: str) -> Optional[StatsSample]:
+        """Один замер (блокирующий, выполняется в пуле потоков)"""
+        now = time.time()
+        if not self.client:
+            # Если Docker API недоступен, используем psutil
+            memory = psutil.virtual_memory()
+            return StatsSample(now, psutil.cpu_percent(), memory.used, memory.total)
+
+        try:
+            # one_shot: без ожидания второго замера внутри Docker, прирост считаем сами
+            stats = self._get_container(container_name).stats(stream=False, one_shot=True)
+        except Exception:
+            self._containers.pop(container_name, None)
+            raise
+
+        previous = self._previous.get(container_name)
+        self._previous[container_name] = stats.get('cpu_stats') or {}
+        percent = cpu_percent(stats, previous)
+        if percent is None:
+            # Первый замер служит только точкой отсчета
+            return None
+        return StatsSample(
+            now,
+            percent,
+            memory_usage(stats),
+            (stats.get('memory_stats') or {}).get('limit', 0)
+        )
+
+    def _sample_process(self, project_id: int, pid: int) -> Optional[StatsSample]:
+        """Замер процесса проекта (блокирующий, выполняется в пуле потоков)"""
+        proc = self._procs.get(project_id)
+        if proc is None or proc.pid != pid:
+            proc = psutil.Process(pid)
+            # Первый вызов служит только точкой отсчета
+            proc.cpu_percent(None)
+            self._procs[project_id] = proc
+            return None
+        with proc.oneshot():
+            percent = proc.cpu_percent(None)
+            rss = proc.memory_info().rss
+        return StatsSample(time.time(), percent, rss, psutil.virtual_memory().total)
+
+    def _process_jobs(self) -> Dict[str, Tuple]:
+        """Ключи истории и аргументы замеров запущенных процессов проектов"""
+        pids = self.processes() if self.processes else {}
+        for project_id in [project_id for project_id in self._procs if project_id not in pids]:
+            del self._procs[project_id]
+            self.history.pop(f"project:{project_id}", None)
+        jobs = {}
+        for project_id, pid in pids.items():
+            key = f"project:{project_id}"
+            self.watch(key)
+            jobs[key] = (self._sample_process, project_id, pid)
+        return jobs
+
+    async def sample_once(self):
+        """Опрос всех отслеживаемых контейнеров и процессов (параллельно, в пределах пула потоков)"""
+        if time.monotonic() - self._discovered_at >= self.discovery_interval:
+            await self.discover()
+
+        loop = asyncio.get_running_loop()
+        jobs = self._process_jobs()
+        for name in self.history:
+            if name not in jobs:
+                jobs[name] = (self._sample, name)
+        names = list(jobs)
+        started = time.monotonic()
+        results = await asyncio.gather(
+            *(loop.run_in_executor(self.executor, *jobs[name]) for name in names),
+            return_exceptions=True
+        )
+        self.sweep_duration = round(time.monotonic() - started, 3)
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                logger.debug(f"Error sampling container {name}: {str(result)}")
+            elif result and name in self.history:
+                self.history[name].append(result)
+                if self.metrics:
+                    self.metrics.add(self.series_key(name), result.timestamp,
+                                     result.cpu_percent, result.memory_usage)
+
+    async def start_sampling(self):
+        """Периодический опрос в фоне"""
+        self._running = True
+        logger.info(f"Docker stats sampling started, interval {self.interval}s")
+        while self._running:
+            started = time.monotonic()
+            try:
+                await self.sample_once()
+            except Exception as e:
+                logger.error(f"Error in stats sampling: {str(e)}")
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def stop_sampling(self):
+        self._running = False
+        self.executor.shutdown(wait=False)
+
+    def get_history(self, container_name: str) -> List[StatsSample]:
+        return list(self.history.get(container_name, ()))
 
     def get_container_stats(self, container_name: str) -> Optional[Dict]:
+        """Последний замер контейнера (без обращения к Docker)"""
         try:
-            if self.client:
-                # Пробуем получить статистику через Docker API
-                container = self.client.containers.get(container_name)
-                stats = container.stats(stream=False)
-                
-                cpu_stats = stats['cpu_stats']
-                memory_stats = stats['memory_stats']
-                
-                cpu_usage = cpu_stats['cpu_usage']['total_usage']
-                system_cpu_usage = cpu_stats['system_cpu_usage']
-                cpu_percent = (cpu_usage / system_cpu_usage) * 100
-                
-                memory_usage = memory_stats['usage']
-                memory_limit = memory_stats['limit']
-                memory_percent = (memory_usage / memory_limit) * 100
-            else:
-                # Если Docker API недоступен, используем psutil
-                cpu_percent = psutil.cpu_percent()
-                memory = psutil.virtual_memory()
-                memory_percent = memory.percent
-                memory_usage = memory.used
-                memory_limit = memory.total
+            samples = self.history.get(container_name)
+            if not samples:
+                return None
+            sample = samples[-1]
 
             return {
-                'cpu_percent': round(cpu_percent, 2),
-                'memory_percent': round(memory_percent, 2),
-                'memory_usage': f"{memory_usage / (1024*1024):.2f}MB",
-                'memory_limit': f"{memory_limit / (1024*1024):.2f}MB"
+                'cpu_percent': round(sample.cpu_percent, 2),
+                'memory_percent': round(sample.memory_percent, 2),
+                'memory_usage': f"{sample.memory_usage / (1024*1024):.2f}MB",
+                'memory_limit': f"{sample.memory_limit / (1024*1024):.2f}MB",
+                'age': round(time.time() - sample.timestamp, 1)
             }
-            
+
         except Exception as e:
             logger.error(f"Error getting container stats: {str(e)}")
             return None
-            
+
+    def get_dashboard(self) -> Dict:
+        """Сводка последних замеров по контейнерам и процессам проектов"""
+        rows = []
+        running = {**self.projects, **{f"project:{project_id}": project_id for project_id in self._procs}}
+        for name, project_id in running.items():
+            samples = self.history.get(name)
+            if samples:
+                rows.append({'name': name, 'project_id': project_id, 'sample': samples[-1]})
+        rows.sort(key=lambda row: row['sample'].cpu_percent, reverse=True)
+        return {
+            'rows': rows,
+            'containers': len(running),
+            'cpu_percent': round(sum(row['sample'].cpu_percent for row in rows), 2),
+            'memory_usage': sum(row['sample'].memory_usage for row in rows),
+            'sweep_duration': self.sweep_duration
+        }
+
     def restart_container(self, container_name: str) -> bool:
         try:
             if not self.client:
                 logger.error("Docker client not initialized")
                 return False
-                
+
             container = self.client.containers.get(container_name)
             container.restart()
             return True
         except Exception as e:
             logger.error(f"Error restarting container: {str(e)}")
-            return False 
\ No newline at end of file
+            return False
@@ -1,36 +1,171 @@
 import asyncio
-import git
-from typing import Optional
-from datetime import datetime
+import heapq
+import logging
+from typing import Optional, Dict, List, Set, Tuple
 from database.db_manager import DatabaseManager, Project
+from database.log_store import bind_project
+from core.async_git import AsyncGit
+from core.commit_index import CommitIndex
+
+logger = logging.getLogger('git_monitor')
 
 class GitMonitor:
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, async_git: Optional[AsyncGit] = None,
+                 max_concurrency: int = 10, refresh_interval: int = 30, full_refresh_every: int = 10,
+                 commit_index: Optional[CommitIndex] = None):
         self.db = db_manager
+        self.git = async_git or AsyncGit()
+        # Новые коммиты дописываются в индекс версий сразу после fetch
+        self.commit_index = commit_index
         self.monitoring = False
-        
+        self.max_concurrency = max(1, max_concurrency)
+        # Как часто перечитывать список проектов из БД (добавление/удаление на лету)
+        self.refresh_interval = refresh_interval
+        # Между полными перечитываниями (нужны для обнаружения удалений) берем только изменения
+        self.full_refresh_every = max(1, full_refresh_every)
+
+        self._projects: Dict[int, Project] = {}
+        # Min-heap (время следующей проверки, project_id)
+        self._schedule: List[Tuple[float, int]] = []
+        # Актуальное время проверки проекта; записи кучи с другим временем устарели
+        self._due: Dict[int, float] = {}
+        self._running: Set[int] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._refresh_requested = False
+        self._revision: Optional[int] = None
+        self._refreshes = 0
+
     async def start_monitoring(self):
+        """Планировщик проверок: каждый проект проверяется по своему check_interval"""
         self.monitoring = True
-        while self.monitoring:
-            projects = await self.db.get_all_projects()
-            for project in projects:
-                await self.check_repository(project)
-                await asyncio.sleep(project.check_interval)
-                
+        self._wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        next_refresh = 0.0
+
+        try:
+            while self.monitoring:
+                now = loop.time()
+                if now >= next_refresh or self._refresh_requested:
+                    # Явное уведомление - полное перечитывание, чтобы сразу увидеть удаления
+                    full = self._refresh_requested
+                    self._refresh_requested = False
+                    await self._refresh_projects(now, full=full)
+                    next_refresh = now + self.refresh_interval
+
+                # Запускаем просроченные проверки, пока есть свободные слоты
+                while self._schedule and self._schedule[0][0] <= now \
+                        and len(self._running) < self.max_concurrency:
+                    due, project_id = heapq.heappop(self._schedule)
+                    if self._due.get(project_id) != due:
+                        continue
+                    del self._due[project_id]
+                    self._running.add(project_id)
+                    task = asyncio.create_task(self._run_check(project_id))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+
+                # Спим до ближайшего дедлайна, обновления списка или завершения проверки
+                wake_at = next_refresh
+                if self._schedule and len(self._running) < self.max_concurrency:
+                    wake_at = min(wake_at, self._schedule[0][0])
+
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(wake_at - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in list(self._tasks):
+                task.cancel()
+            self._running.clear()
+
     async def stop_monitoring(self):
         self.monitoring = False
-        
+        if self._wakeup:
+            self._wakeup.set()
+
+    def notify_projects_changed(self):
+        """Запрос внеочередного полного перечитывания списка проектов"""
+        self._refresh_requested = True
+        if self._wakeup:
+            self._wakeup.set()
+
+    def _schedule_check(self, project_id: int, due: float):
+        self._due[project_id] = due
+        heapq.heappush(self._schedule, (due, project_id))
+
+    async def _refresh_projects(self, now: float, full: bool = False):
+        """Синхронизация расписания со списком проектов в БД"""
+        if full or self._revision is None or self._refreshes % self.full_refresh_every == 0:
+            projects = {project.id: project for project in await self.db.get_all_projects()}
+        else:
+            projects = dict(self._projects)
+            for project in await self.db.get_all_projects(changed_since=self._revision):
+                projects[project.id] = project
+        self._refreshes += 1
+        if projects:
+            self._revision = max(self._revision or 0, max(p.revision for p in projects.values()))
+
+        # Удаленные проекты: их записи в куче станут устаревшими
+        for project_id in set(self._projects) - set(projects):
+            self._due.pop(project_id, None)
+
+        for project_id, project in projects.items():
+            old = self._projects.get(project_id)
+            if project_id in self._running:
+                continue
+            if old is None:
+                # Новый проект проверяем сразу
+                self._schedule_check(project_id, now)
+            elif project.check_interval < old.check_interval:
+                # Интервал уменьшили - не ждем до старого дедлайна
+                due = min(self._due.get(project_id, now), now + max(project.check_interval, 1))
+                self._schedule_check(project_id, due)
+
+        self._projects = projects
+
+        # Чистим кучу от накопившихся устаревших записей
+        if len(self._schedule) > 2 * len(self._due) + 64:
+            self._schedule = [(due, pid) for pid, due in self._due.items()]
+            heapq.heapify(self._schedule)
+
+    async def _run_check(self, project_id: int):
+        # Каждая проверка - отдельная задача, привязка не выходит за ее пределы
+        bind_project(project_id)
+        try:
+            project = self._projects.get(project_id)
+            if project:
+                await self.check_repository(project)
+        except Exception as e:
+            logger.error(f"Error in scheduled check for project {project_id}: {str(e)}")
+        finally:
+            self._running.discard(project_id)
+            project = self._projects.get(project_id)
+            if project and self.monitoring:
+                loop = asyncio.get_running_loop()
+                self._schedule_check(project_id, loop.time() + max(project.check_interval, 1))
+            if self._wakeup:
+                self._wakeup.set()
+
     async def check_repository(self, project: Project) -> Optional[str]:
+        """Проверка новых коммитов: сначала дешевый ls-remote, fetch только при изменениях"""
         try:
-            repo = git.Repo(project.project_path)
-            repo.remotes.origin.fetch()
-            
-            current_commit = repo.head.commit.hexsha
-            if current_commit != project.last_commit:
-                await self.db.update_project_commit(project.id, current_commit)
-                return current_commit
-            return None
-            
+            remote_commit = await self.git.ls_remote(project.project_path, project.branch)
+            if not remote_commit:
+                logger.warning(f"Branch {project.branch} not found on remote for {project.name}")
+                return None
+
+            if remote_commit == project.last_commit:
+                return None
+
+            await self.git.fetch(project.project_path, project.branch)
+            await self.db.update_project_commit(project.id, remote_commit)
+            project.last_commit = remote_commit
+            if self.commit_index:
+                await self.commit_index.update(project, remote_commit)
+            return remote_commit
+
         except Exception as e:
-            print(f"Error checking repository {project.name}: {str(e)}")
-            return None 
\ No newline at end of file
+            logger.error(f"Error checking repository {project.name}: {str(e)}")
+            return None
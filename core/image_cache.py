@@ -0,0 +1,136 @@
+import os
+import io
+import time
+import asyncio
+import hashlib
+import logging
+import tarfile
+from typing import Dict, Optional
+
+logger = logging.getLogger('image_cache')
+
+IMAGE_REPOSITORY = 'cicd-test'
+DEPS_LABEL = 'cicd.test-deps'
+
+DOCKERFILE = """FROM {base_image}
+COPY requirements.txt /tmp/requirements.txt
+RUN pip install --no-cache-dir -r /tmp/requirements.txt && mkdir -p /app
+"""
+
+class ImageCache:
+    """Тестовые образы с зависимостями, адресуемые по хэшу requirements.txt и базового образа.
+
+    Образ пересобирается только при изменении хэша; старые теги удаляются
+    (давно не использованные первыми) при превышении бюджета на диске.
+    """
+
+    def __init__(self, client, base_image: str = 'python:3.9-slim', max_size_mb: int = 4096):
+        self.client = client
+        self.base_image = base_image
+        self.max_size = max_size_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._last_used: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def _call(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: func(*args, **kwargs))
+
+    def _read_requirements(self, project_path: str) -> bytes:
+        requirements_path = os.path.join(project_path, 'requirements.txt')
+        if os.path.exists(requirements_path):
+            with open(requirements_path, 'rb') as f:
+                return f.read()
+        return b''
+
+    def deps_hash(self, requirements: bytes) -> str:
+        digest = hashlib.sha256()
+        digest.update(self.base_image.encode())
+        digest.update(b'\0')
+        digest.update(requirements)
+        return digest.hexdigest()[:16]
+
+    async def ensure(self, project_path: str) -> str:
+        """Тег образа с зависимостями проекта (сборка при отсутствии)"""
+        requirements = await self._call(self._read_requirements, project_path)
+        deps_hash = self.deps_hash(requirements)
+        tag = f"{IMAGE_REPOSITORY}:{deps_hash}"
+
+        lock = self._locks.setdefault(tag, asyncio.Lock())
+        async with lock:
+            try:
+                await self._call(self.client.images.get, tag)
+                self.hits += 1
+            except Exception:
+                self.misses += 1
+                await self._build(tag, deps_hash, requirements)
+                await self.gc(keep=tag)
+
+        self._last_used[tag] = time.time()
+        return tag
+
+    def _build_context(self, requirements: bytes) -> io.BytesIO:
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w') as tar:
+            for name, data in (
+                ('Dockerfile', DOCKERFILE.format(base_image=self.base_image).encode()),
+                ('requirements.txt', requirements)
+            ):
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        buffer.seek(0)
+        return buffer
+
+    async def _build(self, tag: str, deps_hash: str, requirements: bytes):
+        started = time.perf_counter()
+        logger.info(f"Building test image {tag}")
+        await self._call(
+            self.client.images.build,
+            fileobj=self._build_context(requirements),
+            custom_context=True,
+            tag=tag,
+            rm=True,
+            labels={DEPS_LABEL: deps_hash}
+        )
+        logger.info(f"Test image {tag} built in {time.perf_counter() - started:.2f}s")
+
+    async def gc(self, keep: Optional[str] = None):
+        """Удаление старых тегов при превышении бюджета"""
+        try:
+            images = await self._call(self.client.images.list, filters={'label': DEPS_LABEL})
+        except Exception as e:
+            logger.warning(f"Error listing test images: {str(e)}")
+            return
+
+        entries = []
+        for image in images:
+            tag = next((t for t in image.tags if t.startswith(f"{IMAGE_REPOSITORY}:")), None)
+            if not tag:
+                continue
+            # Образы из прошлых запусков бота считаются самыми старыми
+            entries.append((self._last_used.get(tag, 0), image.attrs.get('Size', 0), tag))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, tag in sorted(entries):
+            if total <= self.max_size:
+                break
+            if tag == keep:
+                continue
+            try:
+                # Без force: образ, занятый контейнером, не удаляется
+                await self._call(self.client.images.remove, tag)
+                self._last_used.pop(tag, None)
+                total -= size
+                logger.info(f"Removed test image {tag}")
+            except Exception as e:
+                logger.warning(f"Cannot remove test image {tag}: {str(e)}")
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total * 100, 2) if total else 0.0
+        }
@@ -0,0 +1,212 @@
+import time
+import struct
+import asyncio
+import logging
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger('metrics_store')
+
+# (шаг в секундах, число хранимых точек): 10с - час, 1м - сутки, 1ч - 30 дней
+RESOLUTIONS: Tuple[Tuple[int, int], ...] = ((10, 360), (60, 1440), (3600, 720))
+
+SPARK_CHARS = '▁▂▃▄▅▆▇█'
+
+# Колонки агрегатов: метрика -> (min, sum, max)
+COLUMNS = ('cpu_min', 'cpu_sum', 'cpu_max', 'mem_min', 'mem_sum', 'mem_max')
+
+class RollupSeries:
+    """Ряд агрегатов одного разрешения в колоночном виде (array).
+
+    Каждая точка - корзина длиной resolution секунд с count, min, sum и max
+    по CPU и памяти; хранится не больше capacity последних корзин.
+    """
+
+    def __init__(self, resolution: int, capacity: int):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.ts = array('q')
+        self.count = array('I')
+        self.columns: Dict[str, array] = {name: array('f') for name in COLUMNS}
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def add(self, timestamp: float, cpu: float, memory: float):
+        bucket = int(timestamp // self.resolution) * self.resolution
+        columns = self.columns
+        if self.ts and self.ts[-1] == bucket:
+            index = len(self.ts) - 1
+            self.count[index] += 1
+            columns['cpu_min'][index] = min(columns['cpu_min'][index], cpu)
+            columns['cpu_sum'][index] += cpu
+            columns['cpu_max'][index] = max(columns['cpu_max'][index], cpu)
+            columns['mem_min'][index] = min(columns['mem_min'][index], memory)
+            columns['mem_sum'][index] += memory
+            columns['mem_max'][index] = max(columns['mem_max'][index], memory)
+            return
+        if self.ts and bucket < self.ts[-1]:
+            # Замер из прошлого (сбой часов) - не нарушаем порядок ряда
+            return
+
+        self.ts.append(bucket)
+        self.count.append(1)
+        for name, value in (('cpu_min', cpu), ('cpu_sum', cpu), ('cpu_max', cpu),
+                            ('mem_min', memory), ('mem_sum', memory), ('mem_max', memory)):
+            columns[name].append(value)
+        self._trim(bucket)
+
+    def _trim(self, newest: int):
+        """Удаление корзин старше окна хранения"""
+        start = bisect_left(self.ts, newest - (self.capacity - 1) * self.resolution)
+        if start:
+            del self.ts[:start]
+            del self.count[:start]
+            for column in self.columns.values():
+                del column[:start]
+
+    def points(self, since: float) -> List[Tuple[int, int, float, float, float, float, float, float]]:
+        """Корзины начиная с since: (ts, count, cpu_min, cpu_sum, cpu_max, mem_min, mem_sum, mem_max)"""
+        start = bisect_left(self.ts, int(since // self.resolution) * self.resolution)
+        columns = [self.columns[name] for name in COLUMNS]
+        return [
+            (self.ts[i], self.count[i], *(column[i] for column in columns))
+            for i in range(start, len(self.ts))
+        ]
+
+    def to_bytes(self) -> bytes:
+        return b''.join([
+            struct.pack('<I', len(self.ts)),
+            self.ts.tobytes(),
+            self.count.tobytes(),
+            *(self.columns[name].tobytes() for name in COLUMNS)
+        ])
+
+    def load_bytes(self, data: bytes):
+        (size,) = struct.unpack_from('<I', data)
+        offset = 4
+        for target in [self.ts, self.count, *(self.columns[name] for name in COLUMNS)]:
+            length = size * target.itemsize
+            target.frombytes(data[offset:offset + length])
+            offset += length
+
+class MetricsStore:
+    """История CPU/памяти по рядам (проект или контейнер) с прореживанием 10с/1м/1ч.
+
+    Данные живут в памяти, раз в persist_interval секунд измененные ряды
+    записываются в таблицу metrics одним BLOB на ряд и разрешение.
+    """
+
+    def __init__(self, db=None, resolutions: Tuple[Tuple[int, int], ...] = RESOLUTIONS,
+                 persist_interval: int = 60):
+        self.db = db
+        self.resolutions = resolutions
+        self.persist_interval = persist_interval
+        self.series: Dict[str, List[RollupSeries]] = {}
+        self._dirty = set()
+        self._running = False
+
+    def _get_series(self, key: str) -> List[RollupSeries]:
+        series = self.series.get(key)
+        if series is None:
+            series = [RollupSeries(resolution, capacity) for resolution, capacity in self.resolutions]
+            self.series[key] = series
+        return series
+
+    def add(self, key: str, timestamp: float, cpu: float, memory: float):
+        """Добавление замера сразу во все разрешения"""
+        for rollup in self._get_series(key):
+            rollup.add(timestamp, cpu, memory)
+        self._dirty.add(key)
+
+    def query(self, key: str, window: int, now: Optional[float] = None) -> Tuple[int, List[Tuple]]:
+        """Самое подробное разрешение, покрывающее окно window секунд, и его точки"""
+        now = now or time.time()
+        series = self.series.get(key)
+        if not series:
+            return 0, []
+        rollup = next(
+            (r for r in series if r.resolution * r.capacity >= window),
+            series[-1]
+        )
+        return rollup.resolution, rollup.points(now - window)
+
+    def summary(self, key: str, window: int, now: Optional[float] = None) -> Optional[Dict]:
+        """min/avg/max и средние по корзинам за окно"""
+        resolution, points = self.query(key, window, now)
+        if not points:
+            return None
+        count = sum(p[1] for p in points)
+        return {
+            'resolution': resolution,
+            'samples': count,
+            'cpu_min': min(p[2] for p in points),
+            'cpu_avg': sum(p[3] for p in points) / count,
+            'cpu_max': max(p[4] for p in points),
+            'mem_min': min(p[5] for p in points),
+            'mem_avg': sum(p[6] for p in points) / count,
+            'mem_max': max(p[7] for p in points),
+            'cpu_series': [p[3] / p[1] for p in points],
+            'mem_series': [p[6] / p[1] for p in points]
+        }
+
+    async def load(self):
+        """Загрузка сохраненных рядов"""
+        if not self.db:
+            return
+        try:
+            rows = await self.db.load_metrics()
+        except Exception as e:
+            logger.error(f"Error loading metrics: {str(e)}")
+            return
+        for key, resolution, data in rows:
+            for rollup in self._get_series(key):
+                if rollup.resolution == resolution and not len(rollup):
+                    rollup.load_bytes(data)
+        logger.info(f"Loaded metrics for {len(self.series)} series")
+
+    async def save(self) -> int:
+        """Запись измененных рядов"""
+        if not self.db or not self._dirty:
+            return 0
+        keys, self._dirty = self._dirty, set()
+        rows = [
+            (key, rollup.resolution, rollup.to_bytes())
+            for key in keys
+            for rollup in self.series.get(key, [])
+        ]
+        try:
+            await self.db.save_metrics(rows)
+        except Exception as e:
+            logger.error(f"Error saving metrics: {str(e)}")
+            self._dirty |= keys
+            return 0
+        return len(keys)
+
+    async def start_persisting(self):
+        """Периодическое сохранение в фоне"""
+        self._running = True
+        while self._running:
+            await asyncio.sleep(self.persist_interval)
+            await self.save()
+
+    async def stop_persisting(self):
+        self._running = False
+        await self.save()
+
+def sparkline(values: List[float], width: int = 30) -> str:
+    """Текстовый график: значения сжимаются до width столбцов по максимуму"""
+    if not values:
+        return ''
+    if len(values) > width:
+        step = len(values) / width
+        values = [
+            max(values[int(i * step):max(int((i + 1) * step), int(i * step) + 1)])
+            for i in range(width)
+        ]
+    low, high = min(values), max(values)
+    if high - low < 1e-9:
+        return SPARK_CHARS[0] * len(values)
+    scale = (len(SPARK_CHARS) - 1) / (high - low)
+    return ''.join(SPARK_CHARS[int((value - low) * scale)] for value in values)
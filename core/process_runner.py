@@ -0,0 +1,119 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger('process_runner')
+
+# Обработчик вывода по мере поступления: (имя потока 'stdout'/'stderr', порция
+# текста с переводами строк). Общий для шагов деплоя и тестов в песочнице
+OutputCallback = Callable[[str, str], Optional[Awaitable[None]]]
+
+# Переменные окружения бота, передаваемые процессам проектов (токен и прокси бота - нет)
+BASE_ENV_VARS = ('PATH', 'HOME', 'LANG')
+
+class RingBuffer:
+    """Ограниченный буфер последних строк вывода"""
+
+    def __init__(self, max_lines: int = 200):
+        self.lines = deque(maxlen=max_lines)
+        self.total_lines = 0
+
+    def append(self, line: str):
+        self.lines.append(line)
+        self.total_lines += 1
+
+    @property
+    def dropped(self) -> int:
+        return self.total_lines - len(self.lines)
+
+    def text(self) -> str:
+        return '\n'.join(self.lines)
+
+@dataclass
+class StepResult:
+    name: str
+    command: List[str]
+    exit_code: Optional[int] = None
+    duration: float = 0.0
+    timed_out: bool = False
+    stdout: RingBuffer = field(default_factory=RingBuffer)
+    stderr: RingBuffer = field(default_factory=RingBuffer)
+
+    @property
+    def success(self) -> bool:
+        return self.exit_code == 0 and not self.timed_out
+
+class ProcessRunner:
+    """Запуск подпроцессов через asyncio с таймаутами и потоковым захватом вывода"""
+
+    def __init__(self, max_lines: int = 200):
+        self.max_lines = max_lines
+
+    async def _pump(self, stream: asyncio.StreamReader, buffer: RingBuffer, name: str,
+                    on_output: Optional[OutputCallback]):
+        while True:
+            line = await stream.readline()
+            if not line:
+                break
+            text = line.decode(errors='replace')
+            buffer.append(text.rstrip('\n'))
+            if on_output:
+                result = on_output(name, text)
+                if asyncio.iscoroutine(result):
+                    await result
+
+    @staticmethod
+    def base_env() -> Dict[str, str]:
+        return {name: os.environ[name] for name in BASE_ENV_VARS if name in os.environ}
+
+    async def start(self, command: List[str], cwd: Optional[str] = None,
+                    env: Optional[Dict[str, str]] = None) -> asyncio.subprocess.Process:
+        """Запуск процесса без ожидания завершения.
+
+        Процесс получает только BASE_ENV_VARS из окружения бота и env.
+        """
+        return await asyncio.create_subprocess_exec(
+            *command,
+            cwd=cwd,
+            env={**self.base_env(), **(env or {})},
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+
+    async def capture(self, process: asyncio.subprocess.Process, result: StepResult,
+                      on_output: Optional[OutputCallback] = None):
+        """Чтение вывода процесса в буферы результата до его завершения"""
+        await asyncio.gather(
+            self._pump(process.stdout, result.stdout, 'stdout', on_output),
+            self._pump(process.stderr, result.stderr, 'stderr', on_output)
+        )
+        result.exit_code = await process.wait()
+
+    async def run(self, name: str, command: List[str], cwd: Optional[str] = None,
+                  env: Optional[Dict[str, str]] = None, timeout: Optional[float] = None,
+                  on_output: Optional[OutputCallback] = None) -> StepResult:
+        """Выполнение шага; при таймауте или отмене процесс убивается"""
+        result = StepResult(
+            name=name,
+            command=command,
+            stdout=RingBuffer(self.max_lines),
+            stderr=RingBuffer(self.max_lines)
+        )
+        started = time.perf_counter()
+        process = await self.start(command, cwd, env)
+        try:
+            await asyncio.wait_for(self.capture(process, result, on_output), timeout)
+        except asyncio.TimeoutError:
+            result.timed_out = True
+            logger.error(f"Step {name} timed out after {timeout}s")
+        finally:
+            if process.returncode is None:
+                process.kill()
+                result.exit_code = await process.wait()
+            result.duration = round(time.perf_counter() - started, 2)
+            logger.info(f"Step {name} finished with code {result.exit_code} in {result.duration}s")
+        return result
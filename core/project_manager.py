@@ -1,72 +1,165 @@
 import os
 import git
-from typing import Optional, Dict, List
+import time
+import shutil
+import asyncio
+import hashlib
+from typing import Callable, Optional, Dict, List
 from database.db_manager import DatabaseManager, Project
+from database.log_store import bind_project
+from core.async_git import AsyncGit
+from core.commit_index import CommitIndex
+from core.venv_cache import VenvCache
+from core.release_manager import ReleaseManager
+from core.process_runner import OutputCallback, ProcessRunner, StepResult
+from utils.fs import dir_size
 import logging
 
 logger = logging.getLogger('project_manager')
 
 class ProjectManager:
-    def __init__(self, db_manager: DatabaseManager, projects_dir: str):
+    def __init__(self, db_manager: DatabaseManager, projects_dir: str, async_git: Optional[AsyncGit] = None,
+                 clone_depth: int = 0, clone_filter: str = '', git_cache_dir: Optional[str] = None,
+                 venv_cache: Optional[VenvCache] = None, runner: Optional[ProcessRunner] = None,
+                 commit_index: Optional[CommitIndex] = None, releases: Optional[ReleaseManager] = None,
+                 on_projects_changed: Optional[Callable[[], None]] = None):
         self.db = db_manager
         self.projects_dir = projects_dir
+        self.git = async_git or AsyncGit()
+        # Индекс истории веток для просмотра версий и отката
+        self.commit_index = commit_index or CommitIndex(db_manager, self.git)
+        # Режим клонирования: 0 - полная история, иначе --depth
+        self.clone_depth = clone_depth
+        # Фильтр частичного клона, например blob:none
+        self.clone_filter = clone_filter
+        # Общие bare-хранилища объектов по repo_url (пусто - не использовать)
+        self.git_cache_dir = git_cache_dir
+        # Время клонирования и занимаемое место по проектам
+        self.clone_stats: Dict[str, Dict] = {}
+        self.runner = runner or ProcessRunner()
+        # Общий кэш виртуальных окружений
+        self.venv_cache = venv_cache or VenvCache(os.path.join(projects_dir, '.venv-cache'), runner=self.runner)
+        # Директории релизов: проект запускается из симлинка на активный релиз
+        self.releases = releases or ReleaseManager(os.path.join(projects_dir, '.releases'), self.git)
+        # Результаты шагов последнего деплоя и запущенные процессы по проектам
+        self.deploy_steps: Dict[int, List[StepResult]] = {}
+        self.processes: Dict[int, asyncio.subprocess.Process] = {}
+        self.process_output: Dict[int, StepResult] = {}
+        self._watchers = set()
+        # Уведомление планировщика проверок об изменении списка проектов
+        self.on_projects_changed = on_projects_changed
         
-    async def add_project(self, name: str, repo_url: str, project_path: str, check_interval: int) -> Project:
-        # Проверяем существование директории
-        full_path = os.path.join(self.projects_dir, project_path)
-        os.makedirs(full_path, exist_ok=True)
-        
-        # Добавляем проект в базу данных
-        with self.db.connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO projects (name, repo_url, project_path, check_interval)
-                VALUES (?, ?, ?, ?)
-            ''', (name, repo_url, project_path, check_interval))
-            project_id = cursor.lastrowid
-            
-        return Project(
-            id=project_id,
-            name=name,
-            repo_url=repo_url,
-            project_path=project_path,
-            check_interval=check_interval
-        )
-        
-    async def deploy_project(self, project: Project, is_test: bool = False) -> bool:
+    async def deploy_project(self, project: Project, is_test: bool = False,
+                             on_output: Optional[OutputCallback] = None) -> bool:
+        bind_project(project.id)
+        steps: List[StepResult] = []
+        self.deploy_steps[project.id] = steps
         try:
             # Получаем конфигурационные переменные
-            env_vars = self._get_project_config(project.id, is_test)
+            env_vars = await self.db.get_project_config(project.id, is_test)
             
             # Клонируем или обновляем репозиторий
             repo_path = os.path.join(self.projects_dir, project.project_path)
             if not os.path.exists(os.path.join(repo_path, '.git')):
-                git.Repo.clone_from(project.repo_url, repo_path)
+                await self.git.clone(project.repo_url, repo_path)
             else:
-                repo = git.Repo(repo_path)
-                repo.remotes.origin.pull()
+                await self.git.pull(repo_path)
                 
-            # Создаем виртуальное окружение
-            self._setup_venv(repo_path)
-            
-            # Запускаем проект
-            self._run_project(repo_path, env_vars)
+            # Готовим релиз текущего коммита и запускаем проект из него
+            commit_hash = await self.git.rev_parse(repo_path)
+            await self.switch_release(project, commit_hash, env_vars, steps, on_output, restart=True)
             
             return True
             
         except Exception as e:
             # Логируем ошибку
-            print(f"Error deploying project {project.name}: {str(e)}")
+            logger.error(f"Error deploying project {project.name}: {str(e)}")
             return False
             
-    def _setup_venv(self, project_path: str):
-        # Создаем виртуальное окружение
-        os.system(f'python -m venv {os.path.join(project_path, "venv")}')
-        
-        # Устанавливаем зависимости
-        requirements_path = os.path.join(project_path, 'requirements.txt')
-        if os.path.exists(requirements_path):
-            os.system(f'{os.path.join(project_path, "venv/bin/pip")} install -r {requirements_path}')
+    async def switch_release(self, project: Project, commit_hash: str,
+                             env_vars: Optional[Dict[str, str]] = None,
+                             steps: Optional[List[StepResult]] = None,
+                             on_output: Optional[OutputCallback] = None,
+                             restart: Optional[bool] = None) -> str:
+        """Переключение проекта на релиз коммита.
+
+        Релиз (worktree и venv) готовится до переключения, поэтому при ошибке
+        активный релиз не меняется. Для сохраненных релизов это только замена
+        симлинка. restart=None - перезапуск, только если проект был запущен.
+        """
+        repo_path = os.path.join(self.projects_dir, project.project_path)
+        release_path = await self.releases.prepare(project, repo_path, commit_hash)
+        await self._setup_venv(release_path, steps, on_output)
+
+        current_path = self.releases.activate(project, release_path)
+        if restart is None:
+            restart = project.id in self.processes
+        if restart:
+            if env_vars is None:
+                env_vars = await self.db.get_project_config(project.id, False)
+            await self._run_project(project, current_path, env_vars)
+
+        await self.releases.prune(project, repo_path)
+        return release_path
+
+    async def _setup_venv(self, project_path: str, steps: Optional[List[StepResult]] = None,
+                          on_output: Optional[OutputCallback] = None):
+        """Подключение виртуального окружения из кэша (сборка только при изменении зависимостей)"""
+        projects_dir = os.path.abspath(self.projects_dir)
+        users = [os.path.join(projects_dir, name) for name in os.listdir(projects_dir)]
+        # venv сохраненных релизов тоже используются и не вытесняются
+        users.extend(self.releases.all_releases())
+        await self.venv_cache.ensure(project_path, users, steps, on_output)
+        logger.info(f"Venv cache stats: {self.venv_cache.stats()}")
+
+    async def _run_project(self, project: Project, project_path: str, env_vars: Dict[str, str]):
+        """Запуск main.py проекта в фоне с захватом вывода"""
+        await self.stop_project(project)
+
+        command = [os.path.join(project_path, 'venv', 'bin', 'python'), 'main.py']
+        process = await self.runner.start(command, cwd=project_path, env=env_vars)
+        result = StepResult(name='run', command=command)
+        self.processes[project.id] = process
+        self.process_output[project.id] = result
+        await self.db.update_project_running(project.id, True)
+        logger.info(f"Project {project.name} started with PID {process.pid}")
+
+        async def _watch():
+            started = time.perf_counter()
+            try:
+                await self.runner.capture(process, result)
+            finally:
+                result.duration = round(time.perf_counter() - started, 2)
+                if self.processes.get(project.id) is process:
+                    del self.processes[project.id]
+                    await self.db.update_project_running(project.id, False)
+                logger.info(f"Project {project.name} exited with code {result.exit_code}")
+
+        watcher = asyncio.create_task(_watch())
+        self._watchers.add(watcher)
+        watcher.add_done_callback(self._watchers.discard)
+
+    def running_pids(self) -> Dict[int, int]:
+        """PID запущенных процессов по id проектов"""
+        return {
+            project_id: process.pid
+            for project_id, process in self.processes.items()
+            if process.returncode is None
+        }
+
+    async def stop_project(self, project: Project, timeout: float = 10) -> bool:
+        """Остановка запущенного процесса проекта"""
+        process = self.processes.pop(project.id, None)
+        if not process or process.returncode is not None:
+            return False
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+        await self.db.update_project_running(project.id, False)
+        return True
 
     async def create_project(self, user_id: int, name: str, repo_url: str, branch: str):
         """Создание нового проекта"""
@@ -83,14 +176,13 @@ class ProjectManager:
                 name=name,
                 repo_url=repo_url,
                 project_path=project_path,
-                check_interval=300
+                check_interval=300,
+                branch=branch
             )
             
             if project:
-                logger.info(f"Project created in DB with ID: {project.id}")
-                # Добавляем branch к объекту проекта
-                project.branch = branch
-                logger.info(f"Added branch {branch} to project")
+                logger.info(f"Project created in DB with ID: {project.id}, branch {branch}")
+                self._notify_projects_changed()
             else:
                 logger.error("Failed to create project in DB")
             
@@ -100,12 +192,33 @@ class ProjectManager:
             logger.error(f"Error creating project: {str(e)}")
             return None
             
+    def _notify_projects_changed(self):
+        if self.on_projects_changed:
+            self.on_projects_changed()
+
+    async def get_project(self, project_id: int) -> Optional[Project]:
+        """Получение проекта по id"""
+        return await self.db.get_project(project_id)
+
+    async def get_projects(self, user_id: int) -> List[Project]:
+        """Получение списка проектов пользователя"""
+        return await self.db.get_projects(user_id)
+
+    async def get_all_projects(self) -> List[Project]:
+        """Получение всех проектов"""
+        return await self.db.get_all_projects()
+
+    async def get_test_config(self, project_id: int) -> Dict[str, str]:
+        """Тестовые переменные окружения проекта"""
+        return await self.db.get_project_config(project_id, is_test=True)
+
     async def clone_repository(self, project) -> bool:
         """Клонирование репозитория"""
         try:
             if not project:
                 logger.error("Project object is None")
                 return False
+            bind_project(project.id)
             
             logger.info(f"Starting clone for project: {project.name}")
             projects_dir = os.path.abspath(self.projects_dir)
@@ -114,36 +227,47 @@ class ProjectManager:
             logger.info(f"Full project path: {project_path}")
             logger.info(f"Repository URL: {project.repo_url}")
             
-            # Проверяем и создаем директорию
+            # Существующую копию того же репозитория обновляем инкрементально
             if os.path.exists(project_path):
+                if await self._resync_repository(project, project_path):
+                    return True
                 logger.info(f"Removing existing directory: {project_path}")
-                import shutil
-                shutil.rmtree(project_path)
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, shutil.rmtree, project_path)
             
-            logger.info(f"Creating directory: {projects_dir}")
             os.makedirs(projects_dir, exist_ok=True)
             
             # Проверяем права доступа
-            logger.info(f"Checking permissions for {projects_dir}")
-            try:
-                test_file = os.path.join(projects_dir, 'test.txt')
-                with open(test_file, 'w') as f:
-                    f.write('test')
-                os.remove(test_file)
-                logger.info("Write permissions OK")
-            except Exception as e:
-                logger.error(f"Permission test failed: {str(e)}")
+            if not os.access(projects_dir, os.W_OK):
+                logger.error(f"No write permissions for {projects_dir}")
                 return False
             
             # Пробуем клонировать с полными путями
             try:
+                started = time.perf_counter()
+                reference = await self._update_reference(project.repo_url)
+
                 logger.info(f"Cloning {project.repo_url} to {project_path}")
-                repo = git.Repo.clone_from(
+                await self.git.clone(
                     project.repo_url,
                     project_path,
-                    branch=project.branch
+                    branch=project.branch,
+                    depth=self.clone_depth or None,
+                    filter_spec=self.clone_filter or None,
+                    reference=reference
+                )
+
+                loop = asyncio.get_running_loop()
+                disk_usage = await loop.run_in_executor(None, dir_size, project_path)
+                self.clone_stats[project.name] = {
+                    'clone_time': round(time.perf_counter() - started, 2),
+                    'disk_usage': disk_usage,
+                    'shared_objects': reference is not None
+                }
+                logger.info(
+                    f"Repository cloned successfully in {self.clone_stats[project.name]['clone_time']}s, "
+                    f"{disk_usage / (1024*1024):.2f}MB on disk"
                 )
-                logger.info("Repository cloned successfully")
                 return True
             
             except git.exc.GitCommandError as e:
@@ -153,4 +277,43 @@ class ProjectManager:
         except Exception as e:
             logger.error(f"Error cloning repository: {str(e)}")
             logger.exception(e)  # Полный стек ошибки
-            return False 
\ No newline at end of file
+            return False
+
+    async def _resync_repository(self, project: Project, project_path: str) -> bool:
+        """Fetch недостающих объектов и hard reset на project.branch в существующей копии"""
+        if not os.path.exists(os.path.join(project_path, '.git')):
+            return False
+        try:
+            started = time.perf_counter()
+            if not await self.git.resync(project_path, project.repo_url, project.branch,
+                                         depth=self.clone_depth or None):
+                logger.info(f"Existing checkout at {project_path} points to another remote")
+                return False
+
+            loop = asyncio.get_running_loop()
+            disk_usage = await loop.run_in_executor(None, dir_size, project_path)
+            self.clone_stats[project.name] = {
+                'clone_time': round(time.perf_counter() - started, 2),
+                'disk_usage': disk_usage,
+                'shared_objects': False
+            }
+            logger.info(f"Repository re-synced in {self.clone_stats[project.name]['clone_time']}s")
+            return True
+        except Exception as e:
+            # Поврежденная копия - переходим к полному переклонированию
+            logger.warning(f"Incremental re-sync failed for {project.name}, recloning: {str(e)}")
+            return False
+
+    async def _update_reference(self, repo_url: str) -> Optional[str]:
+        """Обновление общего хранилища объектов для repo_url, возвращает его путь"""
+        if not self.git_cache_dir:
+            return None
+        key = hashlib.sha1(repo_url.encode()).hexdigest()
+        reference = os.path.join(os.path.abspath(self.git_cache_dir), f"{key}.git")
+        try:
+            await self.git.update_reference(repo_url, reference)
+            return reference
+        except Exception as e:
+            # Без общего хранилища клонирование все равно выполнится
+            logger.warning(f"Failed to update shared object store for {repo_url}: {str(e)}")
+            return None
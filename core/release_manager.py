@@ -0,0 +1,125 @@
+import os
+import time
+import shutil
+import asyncio
+import logging
+from typing import List, Optional
+from database.db_manager import Project
+from core.async_git import AsyncGit
+
+logger = logging.getLogger('release_manager')
+
+class ReleaseManager:
+    """Релизы проектов в отдельных директориях с переключением через симлинк.
+
+    Каждый развернутый коммит - git worktree в releases_dir/<id>/releases/<sha>
+    со своим venv; рабочий путь проекта releases_dir/<id>/current - симлинк,
+    заменяемый атомарно. Последние keep релизов сохраняются, поэтому откат
+    к ним - только переключение симлинка и перезапуск.
+    """
+
+    def __init__(self, releases_dir: str, async_git: AsyncGit, keep: int = 3):
+        self.releases_dir = os.path.abspath(releases_dir)
+        self.git = async_git
+        self.keep = max(1, keep)
+        self._locks = {}
+
+    def _lock(self, project: Project) -> asyncio.Lock:
+        return self._locks.setdefault(project.id, asyncio.Lock())
+
+    def project_dir(self, project: Project) -> str:
+        return os.path.join(self.releases_dir, str(project.id))
+
+    def current_path(self, project: Project) -> str:
+        """Рабочий путь проекта (симлинк на активный релиз)"""
+        return os.path.join(self.project_dir(project), 'current')
+
+    def release_path(self, project: Project, commit_hash: str) -> str:
+        return os.path.join(self.project_dir(project), 'releases', commit_hash)
+
+    def current_release(self, project: Project) -> Optional[str]:
+        """Хэш коммита активного релиза"""
+        current = self.current_path(project)
+        if not os.path.islink(current):
+            return None
+        return os.path.basename(os.readlink(current))
+
+    def releases(self, project: Project) -> List[str]:
+        """Готовые релизы проекта, от новых к старым"""
+        root = os.path.join(self.project_dir(project), 'releases')
+        if not os.path.isdir(root):
+            return []
+        paths = [
+            os.path.join(root, name) for name in os.listdir(root)
+            if not name.startswith('.')
+        ]
+        return sorted(paths, key=os.path.getmtime, reverse=True)
+
+    def all_releases(self) -> List[str]:
+        """Директории всех релизов (их venv не должны вытесняться из кэша)"""
+        if not os.path.isdir(self.releases_dir):
+            return []
+        paths = []
+        for project_id in os.listdir(self.releases_dir):
+            root = os.path.join(self.releases_dir, project_id, 'releases')
+            if os.path.isdir(root):
+                paths.extend(os.path.join(root, name) for name in os.listdir(root))
+        return paths
+
+    async def prepare(self, project: Project, repo_path: str, commit_hash: str) -> str:
+        """Директория релиза для коммита (worktree создается, если релиза еще нет)"""
+        commit_hash = await self.git.rev_parse(repo_path, f'{commit_hash}^{{commit}}')
+        path = self.release_path(project, commit_hash)
+        async with self._lock(project):
+            if os.path.isdir(path):
+                # Теплый релиз: только отмечаем использование для порядка вытеснения
+                os.utime(path)
+                return path
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Worktree собирается во временной директории и появляется под именем коммита целиком
+            tmp_path = os.path.join(os.path.dirname(path), f".tmp-{commit_hash}")
+            if os.path.exists(tmp_path):
+                await self._remove_worktree(repo_path, tmp_path)
+            started = time.perf_counter()
+            await self.git.git(repo_path, 'worktree', 'add', '--detach', tmp_path, commit_hash)
+            await self.git.git(repo_path, 'worktree', 'move', tmp_path, path)
+            logger.info(
+                f"Prepared release {commit_hash[:8]} of {project.name} "
+                f"in {time.perf_counter() - started:.2f}s"
+            )
+            return path
+
+    def activate(self, project: Project, release_path: str) -> str:
+        """Атомарное переключение симлинка current на релиз"""
+        current = self.current_path(project)
+        tmp_link = f"{current}.tmp-{os.getpid()}"
+        if os.path.lexists(tmp_link):
+            os.remove(tmp_link)
+        os.symlink(release_path, tmp_link)
+        os.replace(tmp_link, current)
+        os.utime(release_path)
+        logger.info(f"Activated release {os.path.basename(release_path)[:8]} of {project.name}")
+        return current
+
+    async def _remove_worktree(self, repo_path: str, path: str):
+        try:
+            await self.git.git(repo_path, 'worktree', 'remove', '--force', path)
+        except Exception as e:
+            logger.warning(f"Error removing worktree {path}: {str(e)}")
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, lambda: shutil.rmtree(path, ignore_errors=True))
+            await self.git.git(repo_path, 'worktree', 'prune')
+
+    async def prune(self, project: Project, repo_path: str) -> int:
+        """Удаление релизов сверх keep последних (активный не удаляется)"""
+        async with self._lock(project):
+            current = self.current_release(project)
+            stale = [
+                path for path in self.releases(project)[self.keep:]
+                if os.path.basename(path) != current
+            ]
+            for path in stale:
+                await self._remove_worktree(repo_path, path)
+                logger.info(f"Removed release {os.path.basename(path)[:8]} of {project.name}")
+            return len(stale)
@@ -1,75 +1,417 @@
 import os
+import io
+import re
+import json
+import time
+import heapq
 import docker
-import logging
-from typing import Optional, Dict, Tuple
 import asyncio
+import hashlib
+import logging
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional, Dict, List, Tuple
+from core.container_pool import ContainerPool, PooledContainer
+from core.image_cache import ImageCache
+from core.process_runner import OutputCallback
 
 logger = logging.getLogger('test_environment')
 
+# Не копируем в песочницу локальные окружения и историю git
+EXCLUDED_DIRS = {'venv', '.git', '__pycache__'}
+
+# Сколько последних полных логов тестов хранить на проект
+MAX_TEST_LOGS = 5
+
+DURATION_RE = re.compile(r'^([\d.]+)s (?:setup|call|teardown)\s+(\S+::\S+)')
+OUTCOME_RE = re.compile(r'^(PASSED|FAILED|ERROR|XFAIL|XPASS) (\S+::\S+)')
+
+@dataclass
+class ShardResult:
+    index: int
+    test_ids: List[str]
+    exit_code: Optional[int] = None
+    duration: float = 0.0
+    output: str = ''
+    outcomes: Dict[str, str] = field(default_factory=dict)
+    durations: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def success(self) -> bool:
+        # 5 - pytest не нашел тестов
+        return self.exit_code in (0, 5)
+
+def split_shards(test_ids: List[str], durations: Dict[str, float], shards: int) -> List[List[str]]:
+    """Разбиение тестов на шарды по историческим длительностям (жадный LPT)"""
+    known = [durations[t] for t in test_ids if t in durations]
+    default = sum(known) / len(known) if known else 1.0
+    weighted = sorted(test_ids, key=lambda t: durations.get(t, default), reverse=True)
+
+    heap = [(0.0, index) for index in range(shards)]
+    result: List[List[str]] = [[] for _ in range(shards)]
+    for test_id in weighted:
+        load, index = heapq.heappop(heap)
+        result[index].append(test_id)
+        heapq.heappush(heap, (load + durations.get(test_id, default), index))
+    return [shard for shard in result if shard]
+
 class TestEnvironment:
-    def __init__(self, project_path: str, config: Dict):
+    def __init__(self, project_path: str, config: Dict, pool: Optional[ContainerPool] = None,
+                 image_cache: Optional[ImageCache] = None, durations_dir: Optional[str] = None):
         self.project_path = project_path
+        project_name = os.path.basename(os.path.abspath(project_path))
+        state_dir = os.path.dirname(os.path.abspath(project_path))
+        # История длительностей и полные логи хранятся вне рабочей копии проекта
+        self.durations_path = os.path.join(
+            durations_dir or os.path.join(state_dir, '.test-durations'),
+            f"{project_name}.json"
+        )
+        self.log_path = os.path.join(
+            state_dir,
+            '.test-logs',
+            f"{project_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+        )
+        self._log_name_re = re.compile(re.escape(project_name) + r'_\d{8}_\d{6}\.log$')
+        self._log_file = None
         self.config = config
-        self.client = docker.from_env()
+        self.pool = pool or ContainerPool(docker.from_env(), size=0)
+        self.client = self.pool.client
+        self.image_cache = image_cache
+        self.leased: Optional[PooledContainer] = None
         self.container = None
-        
-    async def setup(self) -> Tuple[bool, str]:
-        """Настройка тестового окружения"""
-        try:
-            # Создаем тестовый контейнер
-            self.container = self.client.containers.run(
-                'python:3.9-slim',
-                command='tail -f /dev/null',  # Держим контейнер запущенным
-                detach=True,
-                volumes={
-                    self.project_path: {
-                        'bind': '/app',
-                        'mode': 'rw'
-                    }
-                },
-                environment=self.config,
-                name=f"test_{os.path.basename(self.project_path)}",
-                remove=True
-            )
-            
-            # Устанавливаем зависимости
-            exit_code, output = self.container.exec_run(
-                "pip install -r /app/requirements.txt"
+        # Дополнительные контейнеры для шардов
+        self.shard_containers: List[PooledContainer] = []
+        # Вывод текущего прогона (для отчета при таймауте)
+        self._chunks: List[str] = []
+        self.timed_out = False
+        # Общий дедлайн подготовки и прогона (loop.time())
+        self._deadline: Optional[float] = None
+        # Прогон прерван - контейнеры в неизвестном состоянии и не возвращаются в пул
+        self.aborted = False
+        # Потоки чтения вывода шардов: блокируются на потоке docker до конца
+        # прогона и не должны занимать общий executor цикла событий
+        self._stream_executor: Optional[ThreadPoolExecutor] = None
+
+    async def _call(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: func(*args, **kwargs))
+
+    def _requirements_key(self) -> str:
+        digest = hashlib.sha256()
+        requirements_path = os.path.join(self.project_path, 'requirements.txt')
+        if os.path.exists(requirements_path):
+            with open(requirements_path, 'rb') as f:
+                digest.update(f.read())
+        return digest.hexdigest()[:16]
+
+    def _project_archive(self) -> bytes:
+        """Упаковка проекта в tar для копирования в контейнер"""
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w') as tar:
+            tar.add(
+                self.project_path,
+                arcname='.',
+                filter=lambda info: None if set(info.name.split('/')) & EXCLUDED_DIRS else info
             )
-            
-            if exit_code != 0:
-                raise Exception(f"Failed to install dependencies: {output.decode()}")
-                
+        return buffer.getvalue()
+
+    async def _lease(self) -> PooledContainer:
+        """Аренда контейнера с кодом проекта и установленными зависимостями"""
+        if self.image_cache:
+            # Зависимости уже установлены в образе, собранном по хэшу requirements.txt
+            image = await self.image_cache.ensure(self.project_path)
+            deps_key = image
+            leased = await self.pool.acquire(image=image, deps_key=deps_key)
+            leased.deps_key = deps_key
+        else:
+            deps_key = self._requirements_key()
+            # Берем контейнер из пула (с теми же зависимостями, если есть)
+            leased = await self.pool.acquire(deps_key=deps_key)
+
+        try:
+            archive = await self._call(self._project_archive)
+            await self._call(leased.container.put_archive, '/app', archive)
+
+            # Устанавливаем зависимости только в "холодный" контейнер
+            if leased.deps_key != deps_key:
+                exit_code, output = await self._call(
+                    leased.container.exec_run,
+                    "pip install -r /app/requirements.txt",
+                    environment=self.config
+                )
+
+                if exit_code != 0:
+                    raise Exception(f"Failed to install dependencies: {output.decode()}")
+                leased.deps_key = deps_key
+        except (Exception, asyncio.CancelledError):
+            await self.pool.release(leased, healthy=False)
+            raise
+        return leased
+
+    def _remaining(self, timeout: Optional[float]) -> Optional[float]:
+        """Остаток общего дедлайна (или timeout, если дедлайн не задан)"""
+        if self._deadline is None:
+            return timeout
+        return max(self._deadline - asyncio.get_running_loop().time(), 0)
+
+    async def setup(self, timeout: Optional[float] = None) -> Tuple[bool, str]:
+        """Настройка тестового окружения.
+
+        timeout задает общий дедлайн подготовки (в том числе pip install
+        в холодном контейнере) и последующего run_tests.
+        """
+        if timeout:
+            self._deadline = asyncio.get_running_loop().time() + timeout
+        try:
+            self.leased = await asyncio.wait_for(self._lease(), self._remaining(timeout))
+            self.container = self.leased.container
             return True, "Тестовое окружение настроено"
-            
+
+        except asyncio.TimeoutError:
+            # Контейнер уже возвращен _lease как неисправный
+            self.timed_out = True
+            self.aborted = True
+            error_msg = f"Превышен таймаут подготовки тестового окружения ({timeout} сек)"
+            logger.error(f"Test environment setup for {self.project_path} timed out after {timeout}s")
+            return False, error_msg
         except Exception as e:
             error_msg = f"Ошибка настройки тестового окружения: {str(e)}"
             logger.error(error_msg)
             return False, error_msg
-            
-    async def run_tests(self) -> Tuple[bool, str]:
-        """Запуск тестов"""
+
+    async def run_tests(self, shards: int = 1, on_output: Optional[OutputCallback] = None,
+                        timeout: Optional[float] = None) -> Tuple[bool, str]:
+        """Запуск тестов (при shards > 1 - параллельно в нескольких контейнерах).
+
+        on_output получает вывод по мере выполнения, полный лог пишется в log_path.
+        По истечении timeout прогон прерывается, возвращается накопленный вывод.
+        """
         try:
             if not self.container:
                 return False, "Тестовое окружение не настроено"
-                
-            # Запускаем тесты
-            exit_code, output = self.container.exec_run(
-                "python -m pytest /app/tests"
+
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            self._prune_logs()
+            self._log_file = open(self.log_path, 'w', encoding='utf-8')
+            self._chunks = []
+            self._stream_executor = ThreadPoolExecutor(
+                max_workers=max(1, shards),
+                thread_name_prefix='test-stream'
             )
-            
-            return exit_code == 0, output.decode()
-            
+
+            return await asyncio.wait_for(self._run(shards, on_output), self._remaining(timeout))
+
+        except asyncio.TimeoutError:
+            self.timed_out = True
+            self.aborted = True
+            logger.error(f"Tests for {self.project_path} timed out after {timeout}s")
+            return False, f"Превышен таймаут тестов ({timeout} сек)\n{''.join(self._chunks)}"
+        except asyncio.CancelledError:
+            self.aborted = True
+            raise
         except Exception as e:
             error_msg = f"Ошибка при запуске тестов: {str(e)}"
             logger.error(error_msg)
             return False, error_msg
-            
+        finally:
+            if self._log_file:
+                self._log_file.close()
+                self._log_file = None
+            if self._stream_executor:
+                # Чтение прерванного прогона завершится с удалением контейнера в cleanup
+                self._stream_executor.shutdown(wait=False)
+                self._stream_executor = None
+
+    def _prune_logs(self):
+        """Удаление старых логов проекта: вместе с новым остается MAX_TEST_LOGS"""
+        log_dir = os.path.dirname(self.log_path)
+        # Имя содержит время запуска, поэтому сортировка по имени - по времени
+        logs = sorted(name for name in os.listdir(log_dir) if self._log_name_re.match(name))
+        for name in logs[:max(len(logs) - MAX_TEST_LOGS + 1, 0)]:
+            try:
+                os.remove(os.path.join(log_dir, name))
+            except OSError as e:
+                logger.warning(f"Error removing old test log {name}: {str(e)}")
+
+    async def _run(self, shards: int, on_output: Optional[OutputCallback] = None) -> Tuple[bool, str]:
+        if shards > 1:
+            return await self._run_sharded(shards, on_output)
+
+        # Запускаем тесты
+        exit_code, output = await self._exec_stream(
+            self.container,
+            "python -m pytest /app/tests",
+            on_output
+        )
+
+        return exit_code == 0, output
+
+    async def _exec_stream(self, container, command, on_output: Optional[OutputCallback] = None) -> Tuple[int, str]:
+        """Выполнение команды в контейнере с потоковой передачей вывода"""
+        api = self.client.api
+        exec_id = await self._call(
+            api.exec_create,
+            container.id,
+            command,
+            environment=self.config,
+            workdir='/app'
+        )
+        # demux: stdout и stderr приходят раздельно, как у процессов деплоя
+        stream = await self._call(api.exec_start, exec_id, stream=True, demux=True)
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def _pump():
+            # Блокирующее чтение потока docker в отдельном потоке
+            try:
+                for chunk in stream:
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        reader = loop.run_in_executor(self._stream_executor, _pump)
+        chunks = []
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            for name, data in zip(('stdout', 'stderr'), chunk):
+                if not data:
+                    continue
+                text = data.decode(errors='replace')
+                chunks.append(text)
+                self._chunks.append(text)
+                if self._log_file:
+                    self._log_file.write(text)
+                if on_output:
+                    result = on_output(name, text)
+                    if asyncio.iscoroutine(result):
+                        await result
+        await reader
+
+        inspect = await self._call(api.exec_inspect, exec_id)
+        return inspect.get('ExitCode'), ''.join(chunks)
+
+    async def _collect(self) -> List[str]:
+        """Сбор идентификаторов тестов"""
+        _, output = await self._call(
+            self.container.exec_run,
+            ['python', '-m', 'pytest', 'tests', '--collect-only', '-q'],
+            environment=self.config,
+            workdir='/app'
+        )
+        return [line.strip() for line in output.decode(errors='replace').splitlines() if '::' in line]
+
+    def _load_durations(self) -> Dict[str, float]:
+        try:
+            with open(self.durations_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_durations(self, durations: Dict[str, float]):
+        try:
+            os.makedirs(os.path.dirname(self.durations_path), exist_ok=True)
+            with open(self.durations_path, 'w') as f:
+                json.dump(durations, f)
+        except OSError as e:
+            logger.warning(f"Error saving test durations: {str(e)}")
+
+    async def _run_shard(self, container, shard: ShardResult, on_output: Optional[OutputCallback] = None):
+        started = time.perf_counter()
+        exit_code, output = await self._exec_stream(
+            container,
+            ['python', '-m', 'pytest', '-q', '-rA', '--durations=0', *shard.test_ids],
+            on_output
+        )
+        shard.exit_code = exit_code
+        shard.duration = round(time.perf_counter() - started, 2)
+        shard.output = output
+        for line in shard.output.splitlines():
+            match = DURATION_RE.match(line)
+            if match:
+                test_id = match.group(2)
+                shard.durations[test_id] = shard.durations.get(test_id, 0.0) + float(match.group(1))
+                continue
+            match = OUTCOME_RE.match(line)
+            if match:
+                shard.outcomes[match.group(2)] = match.group(1)
+
+    async def _run_sharded(self, shards: int, on_output: Optional[OutputCallback] = None) -> Tuple[bool, str]:
+        test_ids = await self._collect()
+        if not test_ids:
+            return False, "Тесты не найдены"
+
+        durations = await self._call(self._load_durations)
+        parts = split_shards(test_ids, durations, shards)
+
+        # Первый шард выполняется в основном контейнере, остальные - в арендованных
+        async def _lease_shard():
+            # Контейнер сразу попадает в shard_containers: при отмене по таймауту
+            # cleanup вернет уже полученные аренды
+            leased = await self._lease()
+            self.shard_containers.append(leased)
+            return leased
+
+        leases = await asyncio.gather(*(_lease_shard() for _ in parts[1:]), return_exceptions=True)
+        containers = [self.container]
+        for leased in leases:
+            if isinstance(leased, Exception):
+                logger.warning(f"Failed to lease shard container: {str(leased)}")
+                continue
+            containers.append(leased.container)
+        if len(containers) < len(parts):
+            parts = split_shards(test_ids, durations, len(containers))
+
+        results = [ShardResult(index=i + 1, test_ids=part) for i, part in enumerate(parts)]
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            self._run_shard(container, result, on_output) for container, result in zip(containers, results)
+        ))
+        total_time = time.perf_counter() - started
+
+        for result in results:
+            durations.update(result.durations)
+        await self._call(self._save_durations, durations)
+
+        return self._merge_report(results, total_time)
+
+    @staticmethod
+    def _merge_report(results: List[ShardResult], total_time: float) -> Tuple[bool, str]:
+        """Объединение результатов шардов в один отчет"""
+        success = all(result.success for result in results)
+        outcomes: Dict[str, str] = {}
+        for result in results:
+            outcomes.update(result.outcomes)
+        failed = sorted(t for t, outcome in outcomes.items() if outcome in ('FAILED', 'ERROR'))
+        passed = sum(1 for outcome in outcomes.values() if outcome == 'PASSED')
+
+        lines = [f"Шардов: {len(results)}, общее время: {total_time:.2f}s"]
+        for result in results:
+            status = 'OK' if result.success else f"FAIL (код {result.exit_code})"
+            lines.append(f"Шард {result.index}: {len(result.test_ids)} тестов, {result.duration}s - {status}")
+        lines.append(f"Пройдено: {passed}, упало: {len(failed)}")
+        lines.extend(f"FAILED {test_id}" for test_id in failed)
+        if not success and not failed:
+            # Ошибка без разобранных результатов - показываем хвост вывода упавших шардов
+            for result in results:
+                if not result.success:
+                    lines.append(result.output[-500:])
+        return success, '\n'.join(lines)
+
     async def cleanup(self):
         """Очистка тестового окружения"""
         try:
-            if self.container:
-                self.container.stop()
-                self.container.remove()
+            for leased in [self.leased, *self.shard_containers]:
+                if leased:
+                    # После прерванного прогона контейнер удаляется вместе с зависшими процессами
+                    await self.pool.release(leased, healthy=not self.aborted)
         except Exception as e:
-            logger.error(f"Error cleaning up test environment: {str(e)}") 
\ No newline at end of file
+            logger.error(f"Error cleaning up test environment: {str(e)}")
+        finally:
+            self.leased = None
+            self.container = None
+            self.shard_containers = []
@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+from utils.fs import dir_size
+from core.process_runner import OutputCallback, ProcessRunner, StepResult
+
+logger = logging.getLogger('venv_cache')
+
+META_FILE = 'cache_meta.json'
+
+class VenvCache:
+    """Кэш виртуальных окружений, адресуемый по содержимому.
+
+    Ключ - хэш requirements.txt и версии интерпретатора. Проект получает
+    симлинк venv -> запись кэша; при превышении квоты удаляются давно
+    не использовавшиеся записи.
+    """
+
+    def __init__(self, cache_dir: str, max_size_mb: int = 5120, python: str = sys.executable,
+                 runner: Optional[ProcessRunner] = None, step_timeout: int = 600):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.runner = runner or ProcessRunner()
+        self.step_timeout = step_timeout
+        self.max_size = max_size_mb * 1024 * 1024
+        self.python = python
+        self.hits = 0
+        self.misses = 0
+        self.time_saved = 0.0
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Ключи, которые сейчас подключаются к проектам (еще без симлинка на диске)
+        self._in_flight: Dict[str, int] = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def cache_key(self, requirements_path: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{self.python}|{sys.version}".encode())
+        if os.path.exists(requirements_path):
+            with open(requirements_path, 'rb') as f:
+                digest.update(f.read())
+        return digest.hexdigest()[:32]
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def _read_meta(self, key: str) -> Optional[Dict]:
+        try:
+            with open(os.path.join(self._entry_path(key), META_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    async def ensure(self, project_path: str, users: Iterable[str] = (),
+                     steps: Optional[List[StepResult]] = None,
+                     on_output: Optional[OutputCallback] = None) -> str:
+        """Подключение закэшированного окружения к проекту (сборка при промахе).
+
+        users - директории проектов, чьи окружения нельзя вытеснять,
+        steps - список, куда добавляются результаты шагов сборки,
+        on_output - получатель вывода шагов сборки по мере выполнения.
+        """
+        requirements_path = os.path.join(project_path, 'requirements.txt')
+        key = self.cache_key(requirements_path)
+        entry = self._entry_path(key)
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        try:
+            async with lock:
+                meta = self._read_meta(key)
+                if meta:
+                    self.hits += 1
+                    self.time_saved += meta.get('build_time', 0)
+                    os.utime(os.path.join(entry, META_FILE))
+                    logger.info(f"Venv cache hit {key} for {project_path}")
+                else:
+                    self.misses += 1
+                    await self._build(key, requirements_path, steps if steps is not None else [], on_output)
+                self._link(entry, os.path.join(project_path, 'venv'))
+        finally:
+            self._in_flight[key] -= 1
+            if not self._in_flight[key]:
+                del self._in_flight[key]
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._evict, {key} | self._keys_in_use(users))
+        return entry
+
+    async def _build(self, key: str, requirements_path: str, steps: List[StepResult],
+                     on_output: Optional[OutputCallback] = None):
+        entry = self._entry_path(key)
+        loop = asyncio.get_running_loop()
+        if os.path.exists(entry):
+            # Незавершенная сборка
+            await loop.run_in_executor(None, shutil.rmtree, entry)
+
+        started = time.perf_counter()
+        logger.info(f"Building venv {key}")
+        await self._run('venv', [self.python, '-m', 'venv', entry], steps, on_output)
+        if os.path.exists(requirements_path):
+            await self._run(
+                'pip install',
+                [os.path.join(entry, 'bin', 'pip'), 'install', '-r', requirements_path],
+                steps,
+                on_output
+            )
+
+        build_time = time.perf_counter() - started
+        size = await loop.run_in_executor(None, dir_size, entry)
+        # Файл метаданных пишется последним и служит признаком готовой записи
+        with open(os.path.join(entry, META_FILE), 'w') as f:
+            json.dump({'build_time': round(build_time, 2), 'size': size, 'python': self.python}, f)
+        logger.info(f"Venv {key} built in {build_time:.2f}s ({size / (1024*1024):.2f}MB)")
+
+    async def _run(self, name: str, command: List[str], steps: List[StepResult],
+                   on_output: Optional[OutputCallback] = None):
+        result = await self.runner.run(name, command, timeout=self.step_timeout, on_output=on_output)
+        steps.append(result)
+        if not result.success:
+            reason = 'timed out' if result.timed_out else f"failed with code {result.exit_code}"
+            raise RuntimeError(f"Step {name} {reason}: {result.stderr.text()[-500:]}")
+
+    @staticmethod
+    def _link(entry: str, venv_path: str):
+        """Атомарная замена venv проекта симлинком на запись кэша"""
+        if os.path.isdir(venv_path) and not os.path.islink(venv_path):
+            shutil.rmtree(venv_path)
+        tmp_link = f"{venv_path}.tmp-{os.getpid()}"
+        if os.path.lexists(tmp_link):
+            os.remove(tmp_link)
+        os.symlink(entry, tmp_link)
+        os.replace(tmp_link, venv_path)
+
+    def _keys_in_use(self, project_paths: Iterable[str]) -> set:
+        keys = set()
+        for path in project_paths:
+            venv_path = os.path.join(path, 'venv')
+            if os.path.islink(venv_path):
+                target = os.path.realpath(venv_path)
+                if os.path.dirname(target) == self.cache_dir:
+                    keys.add(os.path.basename(target))
+        return keys
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """(время последнего использования, размер, ключ) для готовых записей"""
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            meta = self._read_meta(key)
+            if meta:
+                mtime = os.path.getmtime(os.path.join(self._entry_path(key), META_FILE))
+                entries.append((mtime, meta.get('size', 0), key))
+        return entries
+
+    def _evict(self, protected: set):
+        """LRU-вытеснение записей при превышении квоты.
+
+        Кроме protected не трогаются записи, которые другие деплои подключают
+        прямо сейчас: их симлинк еще не виден _keys_in_use.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_size:
+                break
+            if key in protected or key in self._in_flight:
+                continue
+            logger.info(f"Evicting venv {key} ({size / (1024*1024):.2f}MB)")
+            shutil.rmtree(self._entry_path(key), ignore_errors=True)
+            total -= size
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        entries = self._entries()
+        return {
+            'entries': len(entries),
+            'size_mb': round(sum(size for _, size, _ in entries) / (1024*1024), 2),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total * 100, 2) if total else 0.0,
+            'time_saved': round(self.time_saved, 2)
+        }
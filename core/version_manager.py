@@ -1,8 +1,9 @@
-import os
-import git
 from typing import List, Optional, Tuple
 from dataclasses import dataclass
 import logging
+from database.db_manager import Commit, Project
+from core.async_git import AsyncGit
+from core.commit_index import CommitIndex
 
 logger = logging.getLogger('version_manager')
 
@@ -13,50 +14,57 @@ class Version:
     commit_date: str
     version_number: int
 
+    @classmethod
+    def from_commit(cls, commit: Commit) -> 'Version':
+        return cls(
+            commit_hash=commit.commit_hash,
+            commit_message=commit.message,
+            commit_date=commit.committed_at or '',
+            version_number=commit.version
+        )
+
 class VersionManager:
-    def __init__(self, project_path: str):
-        self.project_path = project_path
-        self.repo = None
-        try:
-            self.repo = git.Repo(project_path)
-        except git.exc.InvalidGitRepositoryError:
-            logger.error(f"Invalid git repository: {project_path}")
+    def __init__(self, project: Project, commit_index: CommitIndex, async_git: Optional[AsyncGit] = None,
+                 project_manager=None):
+        self.project = project
+        self.project_path = project.project_path
+        self.index = commit_index
+        self.git = async_git or commit_index.git
+        # С ProjectManager откат переключает релиз вместо checkout в рабочей копии
+        self.project_manager = project_manager
 
-    def get_versions(self, limit: int = 10) -> List[Version]:
-        """Получение списка версий"""
-        versions = []
+    async def get_versions(self, limit: int = 10, before_version: Optional[int] = None,
+                           after_version: Optional[int] = None) -> List[Version]:
+        """Получение списка версий ветки проекта (из индекса, от новых к старым)"""
         try:
-            for i, commit in enumerate(self.repo.iter_commits('master', max_count=limit)):
-                versions.append(Version(
-                    commit_hash=commit.hexsha,
-                    commit_message=commit.message.strip(),
-                    commit_date=commit.committed_datetime.strftime('%Y-%m-%d %H:%M:%S'),
-                    version_number=i + 1
-                ))
-            return versions
+            commits = await self.index.versions(self.project, limit, before_version, after_version)
+            return [Version.from_commit(commit) for commit in commits]
         except Exception as e:
             logger.error(f"Error getting versions: {str(e)}")
             return []
 
+    async def latest_version(self) -> Optional[int]:
+        """Номер самой новой проиндексированной версии"""
+        commit = await self.index.latest(self.project)
+        return commit.version if commit else None
+
     async def rollback_to_version(self, version_number: int) -> Tuple[bool, str]:
         """Откат к определенной версии"""
         try:
-            versions = self.get_versions(limit=version_number)
-            if not versions or len(versions) < version_number:
+            target_version = await self.index.get(self.project, version_number)
+            if not target_version:
                 return False, "Версия не найдена"
 
-            target_version = versions[version_number - 1]
-            
-            # Очистка рабочей директории
-            self.repo.git.reset('--hard')
-            self.repo.git.clean('-fd')
-            
-            # Переключение на нужный коммит
-            self.repo.git.checkout(target_version.commit_hash)
-            
+            if self.project_manager:
+                # Переключение симлинка на релиз и перезапуск запущенного проекта
+                await self.project_manager.switch_release(self.project, target_version.commit_hash)
+            else:
+                # Очистка рабочей директории и переключение на нужный коммит
+                await self.git.checkout_clean(self.project_path, target_version.commit_hash)
+
             return True, f"Успешный откат к версии {version_number}"
-            
+
         except Exception as e:
             error_msg = f"Ошибка при откате: {str(e)}"
             logger.error(error_msg)
-            return False, error_msg 
\ No newline at end of file
+            return False, error_msg
@@ -1,7 +1,11 @@
 import sqlite3
 import logging
+from database.pool import ConnectionPool
+from database.cache import TTLCache
+from database.write_buffer import ProjectStateBuffer
+from database.migrations import migrate
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -24,83 +28,91 @@ class Project:
     last_commit: Optional[str] = None
     is_running: bool = False
     branch: str = 'main'
+    revision: int = 0  # Номер изменения записи, для инкрементальной выборки
+
+@dataclass
+class Commit:
+    project_id: int
+    branch: str
+    version: int  # Стабильный номер: 1 - самый старый проиндексированный коммит
+    commit_hash: str
+    message: str
+    committed_at: Optional[str] = None
 
 class DatabaseManager:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, readers: int = 4, user_cache_size: int = 1024, user_cache_ttl: int = 300,
+                 flush_interval_ms: int = 500, flush_max_rows: int = 500):
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path, readers=readers)
+        # Обновления состояния проектов от монитора пишутся пакетами
+        self.state_buffer = ProjectStateBuffer(self.pool, flush_interval_ms, flush_max_rows)
+        # Кэш пользователей по telegram_id: данные почти не меняются, а читаются на каждый callback
+        self.user_cache = TTLCache(maxsize=user_cache_size, ttl=user_cache_ttl)
         self._init_db()
 
     def _init_db(self):
         """Инициализация базы данных"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Создаем таблицу пользователей
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS users (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        telegram_id TEXT UNIQUE NOT NULL,
-                        username TEXT NOT NULL,
-                        is_active BOOLEAN DEFAULT TRUE,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # Создаем таблицу проектов с привязкой к пользователю
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS projects (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL,
-                        name TEXT NOT NULL,
-                        repo_url TEXT NOT NULL,
-                        project_path TEXT NOT NULL,
-                        check_interval INTEGER NOT NULL,
-                        last_commit TEXT,
-                        is_running BOOLEAN DEFAULT FALSE,
-                        branch TEXT DEFAULT 'main',
-                        FOREIGN KEY (user_id) REFERENCES users (id),
-                        UNIQUE(user_id, name)
-                    )
-                ''')
-                
-                # Создаем таблицу конфигурационных переменных
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS project_configs (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        project_id INTEGER,
-                        var_name TEXT NOT NULL,
-                        var_value TEXT NOT NULL,
-                        is_test BOOLEAN DEFAULT FALSE,
-                        FOREIGN KEY (project_id) REFERENCES projects (id),
-                        UNIQUE(project_id, var_name, is_test)
-                    )
-                ''')
-                
-                conn.commit()
-                logger.info("Database initialized successfully")
+            version = self.pool.write_sync(migrate)
+            logger.info(f"Database initialized successfully (schema version {version})")
                 
         except Exception as e:
             logger.error(f"Error initializing database: {str(e)}")
             raise
 
+    def _project_from_row(self, row) -> Project:
+        project = Project(
+            id=row[0],
+            user_id=row[1],
+            name=row[2],
+            repo_url=row[3],
+            project_path=row[4],
+            check_interval=row[5],
+            last_commit=row[6],
+            is_running=bool(row[7]),
+            branch=row[8],
+            revision=row[9]
+        )
+        # Еще не записанные обновления новее строки в базе
+        pending = self.state_buffer.pending(project.id)
+        if pending:
+            if pending.get('last_commit') is not None:
+                project.last_commit = pending['last_commit']
+            if pending.get('is_running') is not None:
+                project.is_running = bool(pending['is_running'])
+        return project
+
+    def close(self):
+        """Запись отложенных обновлений и закрытие пула соединений"""
+        try:
+            self.state_buffer.flush_sync()
+        except Exception as e:
+            logger.error(f"Error flushing project updates on close: {str(e)}")
+        self.pool.close()
+
     async def get_user(self, telegram_id: str) -> Optional[User]:
         """Получение пользователя по telegram_id"""
+        user = self.user_cache.get(telegram_id)
+        if user is not None:
+            return user
+
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT * FROM users WHERE telegram_id = ?', (telegram_id,))
-                row = cursor.fetchone()
+            row = await self.pool.fetchone(
+                'SELECT * FROM users WHERE telegram_id = ?',
+                (telegram_id,)
+            )
                 
-                if row:
-                    return User(
-                        id=row[0],
-                        telegram_id=row[1],
-                        username=row[2],
-                        is_active=bool(row[3]),
-                        created_at=row[4]
-                    )
-                return None
+            if row:
+                user = User(
+                    id=row[0],
+                    telegram_id=row[1],
+                    username=row[2],
+                    is_active=bool(row[3]),
+                    created_at=row[4]
+                )
+                self.user_cache.set(telegram_id, user)
+                return user
+            return None
                 
         except Exception as e:
             logger.error(f"Error getting user: {str(e)}")
@@ -109,17 +121,14 @@ class DatabaseManager:
     async def create_user(self, telegram_id: str, username: str) -> Optional[User]:
         """Создание нового пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    'INSERT INTO users (telegram_id, username) VALUES (?, ?)',
-                    (telegram_id, username)
-                )
-                user_id = cursor.lastrowid
-                conn.commit()
+            await self.pool.execute(
+                'INSERT INTO users (telegram_id, username) VALUES (?, ?)',
+                (telegram_id, username)
+            )
+            self.user_cache.invalidate(telegram_id)
                 
-                # Получаем созданного пользователя со всеми полями
-                return await self.get_user(telegram_id)
+            # Получаем созданного пользователя со всеми полями
+            return await self.get_user(telegram_id)
                 
         except sqlite3.IntegrityError:
             logger.warning(f"User {telegram_id} already exists")
@@ -128,28 +137,25 @@ class DatabaseManager:
             logger.error(f"Error creating user: {str(e)}")
             return None
 
-    async def create_project(self, user_id: int, name: str, repo_url: str, project_path: str, check_interval: int) -> Optional[Project]:
+    async def create_project(self, user_id: int, name: str, repo_url: str, project_path: str, check_interval: int,
+                             branch: str = 'main') -> Optional[Project]:
         """Создание нового проекта"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO projects 
-                    (user_id, name, repo_url, project_path, check_interval)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (user_id, name, repo_url, project_path, check_interval))
-                
-                project_id = cursor.lastrowid
-                conn.commit()
+            project_id, _ = await self.pool.execute('''
+                INSERT INTO projects 
+                (user_id, name, repo_url, project_path, check_interval, branch, revision)
+                VALUES (?, ?, ?, ?, ?, ?, (SELECT COALESCE(MAX(revision), 0) + 1 FROM projects))
+            ''', (user_id, name, repo_url, project_path, check_interval, branch))
                 
-                return Project(
-                    id=project_id,
-                    user_id=user_id,
-                    name=name,
-                    repo_url=repo_url,
-                    project_path=project_path,
-                    check_interval=check_interval
-                )
+            return Project(
+                id=project_id,
+                user_id=user_id,
+                name=name,
+                repo_url=repo_url,
+                project_path=project_path,
+                check_interval=check_interval,
+                branch=branch
+            )
                 
         except sqlite3.IntegrityError as e:
             logger.error(f"Project already exists: {str(e)}")
@@ -161,30 +167,157 @@ class DatabaseManager:
     async def get_projects(self, user_id: int) -> List[Project]:
         """Получение списка проектов пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT id, user_id, name, repo_url, project_path, 
-                           check_interval, last_commit, is_running, branch
-                    FROM projects 
-                    WHERE user_id = ?
-                ''', (user_id,))
-                
-                projects = []
-                for row in cursor.fetchall():
-                    projects.append(Project(
-                        id=row[0],
-                        user_id=row[1],
-                        name=row[2],
-                        repo_url=row[3],
-                        project_path=row[4],
-                        check_interval=row[5],
-                        last_commit=row[6],
-                        is_running=bool(row[7]),
-                        branch=row[8]
-                    ))
-                return projects
+            rows = await self.pool.fetchall('''
+                SELECT id, user_id, name, repo_url, project_path, 
+                       check_interval, last_commit, is_running, branch, revision
+                FROM projects 
+                WHERE user_id = ?
+            ''', (user_id,))
+            return [self._project_from_row(row) for row in rows]
                 
         except Exception as e:
             logger.error(f"Error getting projects: {str(e)}")
-            return [] 
\ No newline at end of file
+            return []
+
+    async def get_project(self, project_id: int) -> Optional[Project]:
+        """Получение проекта по id"""
+        try:
+            row = await self.pool.fetchone('''
+                SELECT id, user_id, name, repo_url, project_path, 
+                       check_interval, last_commit, is_running, branch, revision
+                FROM projects 
+                WHERE id = ?
+            ''', (project_id,))
+            return self._project_from_row(row) if row else None
+                
+        except Exception as e:
+            logger.error(f"Error getting project: {str(e)}")
+            return None
+
+    async def get_all_projects(self, changed_since: Optional[int] = None) -> List[Project]:
+        """Получение списка всех проектов (для мониторинга).
+
+        При changed_since возвращаются только проекты с revision больше указанной.
+        """
+        try:
+            query = '''
+                SELECT id, user_id, name, repo_url, project_path, 
+                       check_interval, last_commit, is_running, branch, revision
+                FROM projects
+            '''
+            params = ()
+            if changed_since is not None:
+                query += ' WHERE revision > ?'
+                params = (changed_since,)
+            rows = await self.pool.fetchall(query, params)
+            return [self._project_from_row(row) for row in rows]
+                
+        except Exception as e:
+            logger.error(f"Error getting all projects: {str(e)}")
+            return []
+
+    async def update_project_commit(self, project_id: int, commit: str) -> bool:
+        """Сохранение последнего известного коммита проекта (отложенная запись)"""
+        self.state_buffer.put(project_id, last_commit=commit)
+        return True
+
+    async def update_project_running(self, project_id: int, is_running: bool) -> bool:
+        """Сохранение признака запуска проекта (отложенная запись)"""
+        self.state_buffer.put(project_id, is_running=is_running)
+        return True
+
+    async def flush_project_updates(self) -> int:
+        """Принудительная запись накопленных обновлений проектов"""
+        return await self.state_buffer.flush()
+
+    async def get_project_config(self, project_id: int, is_test: bool = False) -> Dict[str, str]:
+        """Получение конфигурационных переменных проекта"""
+        try:
+            rows = await self.pool.fetchall('''
+                SELECT var_name, var_value
+                FROM project_configs
+                WHERE project_id = ? AND is_test = ?
+            ''', (project_id, is_test))
+            return {name: value for name, value in rows}
+                
+        except Exception as e:
+            logger.error(f"Error getting project config: {str(e)}")
+            return {}
+
+    async def save_metrics(self, rows: List[Tuple[str, int, bytes]]):
+        """Сохранение рядов метрик: (ряд, разрешение, данные)"""
+        await self.pool.write(lambda conn: conn.executemany('''
+            INSERT OR REPLACE INTO metrics (series, resolution, data, updated_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        ''', rows))
+
+    async def load_metrics(self) -> List[Tuple[str, int, bytes]]:
+        """Загрузка всех рядов метрик"""
+        return await self.pool.fetchall('SELECT series, resolution, data FROM metrics')
+
+    async def get_latest_commit(self, project_id: int, branch: str) -> Optional[Commit]:
+        """Последний проиндексированный коммит ветки"""
+        row = await self.pool.fetchone('''
+            SELECT project_id, branch, version, commit_hash, message, committed_at
+            FROM commits
+            WHERE project_id = ? AND branch = ?
+            ORDER BY version DESC LIMIT 1
+        ''', (project_id, branch))
+        return Commit(*row) if row else None
+
+    async def add_commits(self, project_id: int, branch: str, commits: List[Tuple[str, str, str]]) -> int:
+        """Добавление коммитов (hash, message, date) от старых к новым, номера версий - продолжением"""
+        def _add(conn: sqlite3.Connection) -> int:
+            version = conn.execute(
+                'SELECT COALESCE(MAX(version), 0) FROM commits WHERE project_id = ? AND branch = ?',
+                (project_id, branch)
+            ).fetchone()[0]
+            added = 0
+            for commit_hash, message, committed_at in commits:
+                cursor = conn.execute('''
+                    INSERT OR IGNORE INTO commits
+                    (project_id, branch, version, commit_hash, message, committed_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (project_id, branch, version + 1, commit_hash, message, committed_at))
+                if cursor.rowcount:
+                    version += 1
+                    added += 1
+            return added
+
+        return await self.pool.write(_add)
+
+    async def get_commits(self, project_id: int, branch: str, limit: int = 10,
+                          before_version: Optional[int] = None,
+                          after_version: Optional[int] = None) -> List[Commit]:
+        """Коммиты ветки от новых к старым.
+
+        Страница старее before_version или ближайшие новее after_version.
+        """
+        query = '''
+            SELECT project_id, branch, version, commit_hash, message, committed_at
+            FROM commits
+            WHERE project_id = ? AND branch = ?
+        '''
+        params: list = [project_id, branch]
+        if before_version is not None:
+            query += ' AND version < ?'
+            params.append(before_version)
+        if after_version is not None:
+            # Берем ближайшие к курсору версии, затем разворачиваем
+            query += ' AND version > ? ORDER BY version ASC LIMIT ?'
+            params.extend([after_version, limit])
+            rows = await self.pool.fetchall(query, params)
+            return [Commit(*row) for row in reversed(rows)]
+        query += ' ORDER BY version DESC LIMIT ?'
+        params.append(limit)
+        rows = await self.pool.fetchall(query, params)
+        return [Commit(*row) for row in rows]
+
+    async def get_commit(self, project_id: int, branch: str, version: int) -> Optional[Commit]:
+        """Коммит по номеру версии"""
+        row = await self.pool.fetchone('''
+            SELECT project_id, branch, version, commit_hash, message, committed_at
+            FROM commits
+            WHERE project_id = ? AND branch = ? AND version = ?
+        ''', (project_id, branch, version))
+        return Commit(*row) if row else None
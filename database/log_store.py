@@ -0,0 +1,230 @@
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+import contextvars
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+from database.pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# id проекта, к которому относятся записи лога текущей задачи
+project_id_var: contextvars.ContextVar = contextvars.ContextVar('project_id', default=None)
+
+def bind_project(project_id: Optional[int]):
+    """Привязка последующих записей лога к проекту.
+
+    Каждая задача asyncio работает с копией контекста, поэтому привязка
+    действует до конца текущей задачи и не влияет на остальные.
+    """
+    project_id_var.set(project_id)
+
+@dataclass
+class LogRecord:
+    id: int
+    timestamp: float
+    level: int
+    logger: str
+    project_id: Optional[int]
+    message: str
+
+    @property
+    def level_name(self) -> str:
+        return logging.getLevelName(self.level)
+
+def _schema(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS logs (
+            id INTEGER PRIMARY KEY,
+            ts REAL NOT NULL,
+            level INTEGER NOT NULL,
+            logger TEXT NOT NULL,
+            project_id INTEGER,
+            message TEXT NOT NULL
+        )
+    ''')
+    # Фильтры запросов: период, проект + период, уровень + период
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_logs_ts ON logs (ts)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_logs_project_ts ON logs (project_id, ts)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_logs_level_ts ON logs (level, ts)')
+    # Полнотекстовый индекс по тексту сообщений (external content, без копии текста)
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS logs_fts
+        USING fts5(message, content='logs', content_rowid='id')
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS logs_ai AFTER INSERT ON logs BEGIN
+            INSERT INTO logs_fts (rowid, message) VALUES (new.id, new.message);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS logs_ad AFTER DELETE ON logs BEGIN
+            INSERT INTO logs_fts (logs_fts, rowid, message) VALUES ('delete', old.id, old.message);
+        END
+    ''')
+
+def fts_query(text: str) -> str:
+    """Экранирование пользовательского текста: каждое слово ищется как фраза"""
+    return ' '.join('"{}"'.format(word.replace('"', '""')) for word in text.split())
+
+class LogStore:
+    """Структурированный журнал в отдельной базе SQLite с индексами и FTS5.
+
+    Записи хранятся retention_days дней, более старые удаляет compact().
+    """
+
+    def __init__(self, db_path: str, retention_days: int = 14, readers: int = 2):
+        self.db_path = db_path
+        self.retention_days = retention_days
+        self.pool = ConnectionPool(db_path, readers=readers)
+        self.pool.write_sync(_schema)
+        self._running = False
+
+    def write_batch(self, rows: List[Tuple]):
+        """Постановка пакета (ts, level, logger, project_id, message) в очередь записи"""
+        return self.pool.submit(lambda conn: conn.executemany(
+            'INSERT INTO logs (ts, level, logger, project_id, message) VALUES (?, ?, ?, ?, ?)',
+            rows
+        ))
+
+    async def query(self, project_id: Optional[int] = None, level: Optional[int] = None,
+                    since: Optional[float] = None, until: Optional[float] = None,
+                    text: Optional[str] = None, limit: int = 30,
+                    project_ids: Optional[Iterable[int]] = None) -> List[LogRecord]:
+        """Последние записи по фильтрам (level - минимальный уровень).
+
+        project_ids ограничивает выборку записями этих проектов.
+        """
+        conditions = []
+        params: list = []
+        if project_id is not None:
+            conditions.append('l.project_id = ?')
+            params.append(project_id)
+        if project_ids is not None:
+            project_ids = list(project_ids)
+            if not project_ids:
+                return []
+            conditions.append(f"l.project_id IN ({', '.join('?' * len(project_ids))})")
+            params.extend(project_ids)
+        if level is not None:
+            conditions.append('l.level >= ?')
+            params.append(level)
+        if since is not None:
+            conditions.append('l.ts >= ?')
+            params.append(since)
+        if until is not None:
+            conditions.append('l.ts < ?')
+            params.append(until)
+
+        source = 'logs l'
+        if text and text.strip():
+            source = 'logs_fts JOIN logs l ON l.id = logs_fts.rowid'
+            conditions.append('logs_fts MATCH ?')
+            params.append(fts_query(text))
+
+        sql = f'SELECT l.id, l.ts, l.level, l.logger, l.project_id, l.message FROM {source}'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY l.ts DESC LIMIT ?'
+        params.append(limit)
+
+        rows = await self.pool.fetchall(sql, params)
+        return [LogRecord(*row) for row in reversed(rows)]
+
+    def _compact(self, conn: sqlite3.Connection, cutoff: float, chunk: int = 10000) -> int:
+        deleted = 0
+        while True:
+            # Удаляем порциями, чтобы не держать блокировку записи надолго
+            cursor = conn.execute(
+                'DELETE FROM logs WHERE id IN (SELECT id FROM logs WHERE ts < ? LIMIT ?)',
+                (cutoff, chunk)
+            )
+            conn.commit()
+            deleted += cursor.rowcount
+            if cursor.rowcount < chunk:
+                break
+        if deleted:
+            conn.execute("INSERT INTO logs_fts (logs_fts) VALUES ('optimize')")
+        return deleted
+
+    async def compact(self) -> int:
+        """Удаление записей старше retention_days"""
+        cutoff = time.time() - self.retention_days * 86400
+        deleted = await self.pool.write(lambda conn: self._compact(conn, cutoff))
+        if deleted:
+            logger.info(f"Log store compacted: {deleted} records removed")
+        return deleted
+
+    async def start_compaction(self, interval: int = 3600):
+        """Периодическая очистка в фоне"""
+        self._running = True
+        while self._running:
+            try:
+                await self.compact()
+            except Exception as e:
+                logger.error(f"Error compacting log store: {str(e)}")
+            await asyncio.sleep(interval)
+
+    def stop_compaction(self):
+        self._running = False
+
+    def close(self):
+        self.pool.close()
+
+class LogStoreHandler(logging.Handler):
+    """Обработчик logging, пишущий записи в LogStore пакетами.
+
+    Записи копятся в памяти и передаются потоку-писателю базы при накоплении
+    batch_size записей; остаток сбрасывает фоновый поток раз в flush_interval секунд.
+    """
+
+    def __init__(self, store: LogStore, level: int = logging.NOTSET, batch_size: int = 200,
+                 flush_interval: float = 1.0):
+        super().__init__(level)
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: List[Tuple] = []
+        self._buffer_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name='log-store-flush', daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            message = record.getMessage()
+            if record.exc_info:
+                message = f"{message}\n{logging.Formatter().formatException(record.exc_info)}"
+            project_id = getattr(record, 'project_id', None)
+            if project_id is None:
+                project_id = project_id_var.get()
+            row = (record.created, record.levelno, record.name, project_id, message)
+
+            with self._buffer_lock:
+                self._buffer.append(row)
+                due = len(self._buffer) >= self.batch_size
+            if due:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        with self._buffer_lock:
+            rows, self._buffer = self._buffer, []
+        if rows:
+            try:
+                self.store.write_batch(rows)
+            except RuntimeError:
+                # Поток записи уже остановлен при завершении процесса
+                pass
+
+    def close(self):
+        self._stopped.set()
+        self.flush()
+        super().close()
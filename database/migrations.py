@@ -0,0 +1,143 @@
+import sqlite3
+import logging
+from typing import Callable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+def _initial_schema(cursor: sqlite3.Cursor):
+    # Создаем таблицу пользователей
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id TEXT UNIQUE NOT NULL,
+            username TEXT NOT NULL,
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Создаем таблицу проектов с привязкой к пользователю
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS projects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            repo_url TEXT NOT NULL,
+            project_path TEXT NOT NULL,
+            check_interval INTEGER NOT NULL,
+            last_commit TEXT,
+            is_running BOOLEAN DEFAULT FALSE,
+            branch TEXT DEFAULT 'main',
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            UNIQUE(user_id, name)
+        )
+    ''')
+
+    # Создаем таблицу конфигурационных переменных
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS project_configs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER,
+            var_name TEXT NOT NULL,
+            var_value TEXT NOT NULL,
+            is_test BOOLEAN DEFAULT FALSE,
+            FOREIGN KEY (project_id) REFERENCES projects (id),
+            UNIQUE(project_id, var_name, is_test)
+        )
+    ''')
+
+def _project_revision(cursor: sqlite3.Cursor):
+    # В базах, обновленных до появления миграций, колонка уже может существовать
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(projects)')]
+    if 'revision' not in columns:
+        cursor.execute('ALTER TABLE projects ADD COLUMN revision INTEGER NOT NULL DEFAULT 0')
+
+def _hot_query_indexes(cursor: sqlite3.Cursor):
+    # get_projects: WHERE user_id = ?
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_projects_user_id ON projects (user_id)')
+    # Конфигурация проекта: WHERE project_id = ? AND is_test = ?
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_project_configs_project ON project_configs (project_id, is_test)')
+    # Инкрементальная выборка монитора: WHERE revision > ?
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_projects_revision ON projects (revision)')
+
+def _metrics(cursor: sqlite3.Cursor):
+    # История метрик: один BLOB с колонками агрегатов на ряд и разрешение
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS metrics (
+            series TEXT NOT NULL,
+            resolution INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (series, resolution)
+        )
+    ''')
+
+def _commit_index(cursor: sqlite3.Cursor):
+    # Индекс истории: стабильный номер версии в пределах проекта и ветки
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS commits (
+            project_id INTEGER NOT NULL,
+            branch TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            commit_hash TEXT NOT NULL,
+            message TEXT NOT NULL DEFAULT '',
+            committed_at TEXT,
+            FOREIGN KEY (project_id) REFERENCES projects (id),
+            PRIMARY KEY (project_id, branch, version),
+            UNIQUE (project_id, branch, commit_hash)
+        )
+    ''')
+
+def _project_owner_ids(cursor: sqlite3.Cursor):
+    # Проекты ранее сохранялись с telegram id вместо users.id - переводим на users.id
+    cursor.execute('''
+        UPDATE projects
+        SET user_id = (SELECT u.id FROM users u WHERE u.telegram_id = CAST(projects.user_id AS TEXT))
+        WHERE user_id NOT IN (SELECT id FROM users)
+          AND EXISTS (SELECT 1 FROM users u WHERE u.telegram_id = CAST(projects.user_id AS TEXT))
+    ''')
+
+# Упорядоченный список миграций: (версия, описание, функция)
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Cursor], None]]] = [
+    (1, 'initial schema', _initial_schema),
+    (2, 'projects.revision', _project_revision),
+    (3, 'indexes for hot queries', _hot_query_indexes),
+    (4, 'metrics history', _metrics),
+    (5, 'commit history index', _commit_index),
+    (6, 'projects.user_id references users.id', _project_owner_ids),
+]
+
+def current_version(conn: sqlite3.Connection) -> int:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Применение недостающих миграций, каждая в своей транзакции"""
+    version = current_version(conn)
+    conn.commit()
+
+    for number, name, migration in MIGRATIONS:
+        if number <= version:
+            continue
+        try:
+            conn.execute('BEGIN')
+            migration(conn.cursor())
+            conn.execute(
+                'INSERT INTO schema_version (version, name) VALUES (?, ?)',
+                (number, name)
+            )
+            conn.commit()
+            version = number
+            logger.info(f"Applied migration {number}: {name}")
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Migration {number} ({name}) failed: {str(e)}")
+            raise
+
+    return version
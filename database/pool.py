@@ -0,0 +1,95 @@
+import sqlite3
+import asyncio
+import threading
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Настройки соединений: WAL позволяет читателям работать параллельно с записью
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-8000',
+    'PRAGMA mmap_size=67108864',
+    'PRAGMA busy_timeout=5000',
+)
+
+class ConnectionPool:
+    """Пул долгоживущих соединений SQLite.
+
+    Чтение выполняется в пуле потоков-читателей (у каждого потока свое соединение),
+    запись сериализуется через единственный поток-писатель.
+    """
+
+    def __init__(self, db_path: str, readers: int = 4):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+        self._readers = ThreadPoolExecutor(max_workers=max(1, readers), thread_name_prefix='db-reader')
+
+    def _connection(self, readonly: bool) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            if readonly:
+                conn.execute('PRAGMA query_only=ON')
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _run_read(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        return func(self._connection(readonly=True))
+
+    def _run_write(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        conn = self._connection(readonly=False)
+        # Контекстный менеджер соединения: commit при успехе, rollback при ошибке
+        with conn:
+            return func(conn)
+
+    async def read(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self._run_read, func)
+
+    async def write(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, self._run_write, func)
+
+    def submit(self, func: Callable[[sqlite3.Connection], Any]) -> Future:
+        """Запись без ожидания результата (из любого потока)"""
+        return self._writer.submit(self._run_write, func)
+
+    def write_sync(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Синхронная запись (для инициализации вне event loop)"""
+        return self._writer.submit(self._run_write, func).result()
+
+    async def fetchone(self, sql: str, params: Sequence = ()) -> Optional[Tuple]:
+        return await self.read(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql: str, params: Sequence = ()) -> List[Tuple]:
+        return await self.read(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def execute(self, sql: str, params: Sequence = ()) -> Tuple[Optional[int], int]:
+        """Выполнение запроса на запись, возвращает (lastrowid, rowcount)"""
+        def _execute(conn: sqlite3.Connection):
+            cursor = conn.execute(sql, params)
+            return cursor.lastrowid, cursor.rowcount
+        return await self.write(_execute)
+
+    def close(self):
+        self._readers.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception as e:
+                    logger.warning(f"Error closing connection: {str(e)}")
+            self._connections.clear()
@@ -0,0 +1,79 @@
+import sqlite3
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+from database.pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+class ProjectStateBuffer:
+    """Отложенная (write-behind) запись состояния проектов.
+
+    Обновления last_commit/is_running копятся в памяти и сбрасываются одной
+    транзакцией раз в flush_interval_ms или при накоплении max_rows проектов.
+    """
+
+    def __init__(self, pool: ConnectionPool, flush_interval_ms: int = 500, max_rows: int = 500):
+        self.pool = pool
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_rows = max(1, max_rows)
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._tasks = set()
+        self._flush_lock = asyncio.Lock()
+
+    def put(self, project_id: int, **fields):
+        """Постановка обновления в очередь; повторные обновления проекта объединяются"""
+        self._pending.setdefault(project_id, {}).update(fields)
+
+        if len(self._pending) >= self.max_rows:
+            task = asyncio.create_task(self.flush())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    def pending(self, project_id: int) -> Optional[Dict[str, Any]]:
+        return self._pending.get(project_id)
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self) -> int:
+        """Запись накопленных обновлений одной транзакцией"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            try:
+                await self.pool.write(lambda conn: self._write_batch(conn, batch))
+                return len(batch)
+            except Exception as e:
+                logger.error(f"Error flushing project updates: {str(e)}")
+                # Возвращаем неудачный пакет, не затирая более свежие значения
+                for project_id, fields in batch.items():
+                    self._pending[project_id] = {**fields, **self._pending.get(project_id, {})}
+                return 0
+
+    def flush_sync(self) -> int:
+        """Синхронная запись остатка (при закрытии, вне event loop)"""
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+        self.pool.write_sync(lambda conn: self._write_batch(conn, batch))
+        return len(batch)
+
+    @staticmethod
+    def _write_batch(conn: sqlite3.Connection, batch: Dict[int, Dict[str, Any]]):
+        revision = conn.execute('SELECT COALESCE(MAX(revision), 0) + 1 FROM projects').fetchone()[0]
+        conn.executemany('''
+            UPDATE projects
+            SET last_commit = COALESCE(?, last_commit),
+                is_running = COALESCE(?, is_running),
+                revision = ?
+            WHERE id = ?
+        ''', [
+            (fields.get('last_commit'), fields.get('is_running'), revision, project_id)
+            for project_id, fields in batch.items()
+        ])
@@ -1,33 +1,117 @@
+import queue
+import atexit
 import asyncio
 import logging
 import sys
 import time
 import os
+from typing import List, Optional
 from telebot.async_telebot import AsyncTeleBot
 from config.config import Config
 from database.db_manager import DatabaseManager
+from database.log_store import LogStore, LogStoreHandler
 from core.project_manager import ProjectManager
 from core.git_monitor import GitMonitor
+from core.async_git import AsyncGit
+from core.commit_index import CommitIndex
+from core.venv_cache import VenvCache
+from core.release_manager import ReleaseManager
+from core.process_runner import ProcessRunner
 from core.docker_monitor import DockerMonitor
+from core.metrics_store import MetricsStore
+from core.container_pool import ContainerPool
+from core.image_cache import ImageCache
 from utils.error_handler import ErrorHandler
+from utils.log_pipeline import BatchingQueueListener, BatchRotatingFileHandler, BatchStreamHandler, DroppingQueueHandler
 from bot.handlers import BotHandlers
 import telebot
+import docker
 
-async def setup_logging(config: Config):
-    """Настройка логирования"""
+# Слушатель очереди логов текущего запуска main()
+_log_listener: Optional[BatchingQueueListener] = None
+
+def close_logging():
+    """Дописывание очереди логов, закрытие обработчиков и хранилища логов.
+
+    До следующей настройки записи уходят в logging.lastResort (stderr).
+    """
+    global _log_listener
+    listener, _log_listener = _log_listener, None
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, DroppingQueueHandler):
+            root.removeHandler(handler)
+    if not listener:
+        return
+    listener.stop()
+    for handler in listener.handlers:
+        try:
+            handler.close()
+            if isinstance(handler, LogStoreHandler):
+                handler.store.close()
+        except Exception as e:
+            print(f"Error closing log handler: {str(e)}")
+
+# Дописываем очередь при завершении процесса
+atexit.register(close_logging)
+
+async def setup_logging(config: Config) -> Optional[LogStore]:
+    """Настройка логирования, возвращает структурированное хранилище логов.
+
+    Вызывающий код только ставит записи в очередь, запись в файл, stdout
+    и хранилище выполняет поток слушателя пачками.
+    """
+    global _log_listener
     try:
-        logging.basicConfig(
-            level=getattr(logging, config.log_level),
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.StreamHandler(sys.stdout),
-                logging.FileHandler('bot.log')
-            ]
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        handlers = [
+            BatchStreamHandler(sys.stdout),
+            # Ротация по размеру: файл лога не растет бесконечно
+            BatchRotatingFileHandler(
+                config.log_file,
+                maxBytes=config.log_max_mb * 1024 * 1024,
+                backupCount=config.log_backup_count,
+                encoding='utf-8'
+            )
+        ]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        
+        # Структурированные записи для поиска по проекту, уровню и периоду
+        log_store = None
+        try:
+            log_store = LogStore(
+                config.log_db_path or os.path.join(os.path.dirname(config.database_path), 'logs.db'),
+                retention_days=config.log_retention_days
+            )
+            handlers.append(LogStoreHandler(log_store))
+        except Exception as e:
+            print(f"Failed to open log store: {str(e)}")
+        
+        log_queue = queue.Queue(maxsize=config.log_queue_size)
+        queue_handler = DroppingQueueHandler(log_queue)
+        listener = BatchingQueueListener(
+            log_queue,
+            *handlers,
+            batch_size=config.log_batch_size,
+            queue_handler=queue_handler
         )
+        
+        root = logging.getLogger()
+        root.setLevel(getattr(logging, config.log_level))
+        # При перезапуске main() заменяем конвейер предыдущего запуска
+        close_logging()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        _log_listener = listener
+        root.addHandler(queue_handler)
+        listener.start()
+        return log_store
     except Exception as e:
         print(f"Failed to setup logging: {str(e)}")
         # Настройка базового логирования в случае ошибки
         logging.basicConfig(level=logging.INFO)
+        return None
 
 async def setup_proxy(config: Config):
     """Настройка прокси"""
@@ -47,31 +131,135 @@ async def init_components(config: Config):
             raise ValueError("Invalid configuration")
 
         bot = AsyncTeleBot(config.bot_token)
-        db_manager = DatabaseManager(config.database_path)
-        project_manager = ProjectManager(db_manager, config.projects_base_dir)
-        git_monitor = GitMonitor(db_manager)
+        db_manager = DatabaseManager(
+            config.database_path,
+            user_cache_size=config.user_cache_size,
+            user_cache_ttl=config.user_cache_ttl,
+            flush_interval_ms=config.state_flush_interval_ms,
+            flush_max_rows=config.state_flush_max_rows
+        )
+        async_git = AsyncGit(max_workers=config.git_workers, timeout=config.git_timeout)
+        commit_index = CommitIndex(db_manager, async_git)
+        runner = ProcessRunner()
+        venv_cache = VenvCache(
+            config.venv_cache_dir or os.path.join(config.projects_base_dir, '.venv-cache'),
+            max_size_mb=config.venv_cache_max_mb,
+            runner=runner,
+            step_timeout=config.deploy_step_timeout
+        )
+        project_manager = ProjectManager(
+            db_manager,
+            config.projects_base_dir,
+            async_git,
+            clone_depth=config.clone_depth,
+            clone_filter=config.clone_filter,
+            git_cache_dir=config.git_cache_dir,
+            venv_cache=venv_cache,
+            runner=runner,
+            commit_index=commit_index,
+            releases=ReleaseManager(
+                os.path.join(config.projects_base_dir, '.releases'),
+                async_git,
+                keep=config.releases_keep
+            )
+        )
+        git_monitor = GitMonitor(
+            db_manager,
+            async_git,
+            max_concurrency=config.max_concurrent_checks,
+            commit_index=commit_index
+        )
+        # Новые проекты попадают в расписание проверок сразу
+        project_manager.on_projects_changed = git_monitor.notify_projects_changed
         
         # Инициализируем Docker monitor только если он не отключен
         docker_monitor = None
         if not os.getenv('DISABLE_DOCKER_MONITOR', '').lower() in ['true', '1', 'yes']:
-            docker_monitor = DockerMonitor()
+            metrics_store = MetricsStore(db_manager, persist_interval=config.metrics_persist_interval)
+            await metrics_store.load()
+            docker_monitor = DockerMonitor(
+                interval=config.stats_interval,
+                history_size=config.stats_history_size,
+                max_concurrency=config.stats_max_concurrency,
+                discovery_interval=config.stats_discovery_interval,
+                metrics=metrics_store,
+                # Проекты запускаются процессами на хосте - опрашиваем их по PID
+                processes=project_manager.running_pids
+            )
         else:
             logging.info("Docker monitoring is disabled")
             
+        # Пул песочниц для тестов требует доступного Docker, но не мониторинга статистики
+        container_pool = None
+        image_cache = None
+        try:
+            docker_client = docker.from_env()
+            docker_client.ping()
+        except Exception as e:
+            logging.warning(f"Docker is not available, test sandboxes are disabled: {str(e)}")
+        else:
+            container_pool = ContainerPool(
+                docker_client,
+                image=config.test_base_image,
+                size=config.test_pool_size,
+                idle_timeout=config.test_pool_idle_timeout
+            )
+            # Песочницы прошлого запуска (выход или перезапуск main) больше никому не нужны
+            await container_pool.remove_stale()
+            image_cache = ImageCache(
+                docker_client,
+                base_image=config.test_base_image,
+                max_size_mb=config.test_image_budget_mb
+            )
+            
         error_handler = ErrorHandler(bot)
 
-        return bot, db_manager, project_manager, git_monitor, docker_monitor, error_handler
+        return bot, db_manager, project_manager, git_monitor, docker_monitor, container_pool, image_cache, error_handler, async_git
     except Exception as e:
         logging.error(f"Failed to initialize components: {str(e)}")
         raise
 
+async def shutdown(components, tasks: List[asyncio.Task]):
+    """Остановка фоновых задач и освобождение ресурсов перед выходом или перезапуском"""
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if not components:
+        return
+    bot, db_manager, project_manager, git_monitor, docker_monitor, container_pool, image_cache, error_handler, async_git = components
+    if docker_monitor:
+        # Потоки опроса контейнеров и процессов завершаются, накопленные
+        # агрегаты метрик записываются до закрытия базы
+        docker_monitor.stop_sampling()
+        if docker_monitor.metrics:
+            try:
+                await docker_monitor.metrics.stop_persisting()
+            except Exception as e:
+                logging.error(f"Error saving metrics: {str(e)}")
+    if container_pool:
+        try:
+            await container_pool.close()
+        except Exception as e:
+            logging.error(f"Error closing container pool: {str(e)}")
+    # Фоновые задачи отменены - потоки git больше не нужны
+    async_git.shutdown()
+    try:
+        # Отложенные обновления проектов записываются, потоки пула соединений завершаются
+        db_manager.close()
+    except Exception as e:
+        logging.error(f"Error closing database: {str(e)}")
+    # Последним закрывается логирование: обработчики файла и хранилища логов
+    close_logging()
+
 async def main():
+    components = None
+    tasks: List[asyncio.Task] = []
     try:
         # Загрузка конфигурации
         config = Config.from_env()
         
         # Настройка логирования
-        await setup_logging(config)
+        log_store = await setup_logging(config)
         logger = logging.getLogger('main')
         
         # Настройка прокси
@@ -82,7 +270,7 @@ async def main():
         if not components:
             raise RuntimeError("Failed to initialize components")
             
-        bot, db_manager, project_manager, git_monitor, docker_monitor, error_handler = components
+        bot, db_manager, project_manager, git_monitor, docker_monitor, container_pool, image_cache, error_handler, async_git = components
         
         # Инициализация обработчиков бота
         handlers = BotHandlers(
@@ -90,11 +278,28 @@ async def main():
             config,
             project_manager,
             docker_monitor,
-            error_handler
+            error_handler,
+            container_pool,
+            image_cache,
+            log_store
         )
         
         # Запуск мониторинга Git репозиториев
-        monitoring_task = asyncio.create_task(git_monitor.start_monitoring())
+        tasks.append(asyncio.create_task(git_monitor.start_monitoring()))
+        
+        # Удаление устаревших записей структурированного лога
+        if log_store:
+            tasks.append(asyncio.create_task(log_store.start_compaction()))
+        
+        # Фоновый сбор статистики контейнеров
+        if docker_monitor:
+            tasks.append(asyncio.create_task(docker_monitor.start_sampling()))
+            tasks.append(asyncio.create_task(docker_monitor.metrics.start_persisting()))
+        
+        # Удаление простаивающих тестовых контейнеров. Пул образа
+        # прогревается после его первой аренды
+        if container_pool:
+            tasks.append(asyncio.create_task(container_pool.start_eviction()))
         
         logger.info("Bot started successfully")
         
@@ -103,10 +308,15 @@ async def main():
         
     except Exception as e:
         logging.error(f"Critical error: {str(e)}")
-        # Пауза перед перезапуском
-        await asyncio.sleep(5)
-        # Перезапуск main()
-        await main()
+    else:
+        return
+    finally:
+        await shutdown(components, tasks)
+        
+    # Пауза перед перезапуском
+    await asyncio.sleep(5)
+    # Перезапуск main()
+    await main()
 
 if __name__ == "__main__":
     while True:
@@ -0,0 +1,27 @@
+import asyncio
+import pytest
+from database.db_manager import DatabaseManager
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'test.db'))
+    yield db
+    db.close()
+
+def test_create_project_stores_branch(db):
+    async def scenario():
+        created = await db.create_project(1, 'app', 'https://example.com/app.git', '/projects/app', 300,
+                                          branch='develop')
+        return created, await db.get_project(created.id), await db.get_all_projects()
+
+    created, stored, all_projects = asyncio.run(scenario())
+    assert created.branch == 'develop'
+    assert stored.branch == 'develop'
+    assert [project.branch for project in all_projects] == ['develop']
+
+def test_create_project_default_branch(db):
+    async def scenario():
+        created = await db.create_project(1, 'app', 'https://example.com/app.git', '/projects/app', 300)
+        return await db.get_project(created.id)
+
+    assert asyncio.run(scenario()).branch == 'main'
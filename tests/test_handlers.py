@@ -0,0 +1,119 @@
+import time
+import asyncio
+from types import SimpleNamespace
+import pytest
+from bot.handlers import BotHandlers
+from core.project_manager import ProjectManager
+from database.db_manager import DatabaseManager
+from database.log_store import LogStore
+
+class FakeBot:
+    """Минимальная замена AsyncTeleBot: регистрирует обработчики и запоминает ответы"""
+
+    def __init__(self):
+        self.sent = []
+        self.edited = []
+
+    def message_handler(self, **kwargs):
+        return lambda handler: handler
+
+    def callback_query_handler(self, **kwargs):
+        return lambda handler: handler
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(text)
+
+    async def reply_to(self, message, text, **kwargs):
+        self.sent.append(text)
+
+    async def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        self.edited.append(text)
+
+    async def answer_callback_query(self, callback_query_id, text=None, **kwargs):
+        if text:
+            self.sent.append(text)
+
+def _message(telegram_id: int, text: str):
+    return SimpleNamespace(
+        text=text,
+        chat=SimpleNamespace(id=telegram_id),
+        from_user=SimpleNamespace(id=telegram_id, username=f"user{telegram_id}")
+    )
+
+def _callback(telegram_id: int, data: str):
+    return SimpleNamespace(
+        id='callback',
+        data=data,
+        message=SimpleNamespace(chat=SimpleNamespace(id=telegram_id), message_id=1),
+        from_user=SimpleNamespace(id=telegram_id, username=f"user{telegram_id}")
+    )
+
+@pytest.fixture
+def env(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'test.db'))
+    store = LogStore(str(tmp_path / 'logs.db'))
+    project_manager = ProjectManager(db, str(tmp_path / 'projects'))
+
+    async def clone_repository(project):
+        return True
+    project_manager.clone_repository = clone_repository
+
+    deployed = []
+
+    async def deploy_project(project, is_test=False, on_output=None):
+        deployed.append(project.name)
+        on_output('stdout', 'Collecting requests\n')
+        on_output('stderr', 'pip warning\n')
+        await asyncio.sleep(0.05)
+        return True
+    project_manager.deploy_project = deploy_project
+
+    bot = FakeBot()
+    config = SimpleNamespace(max_log_lines=50, live_update_interval=0.01)
+    handlers = BotHandlers(bot, config, project_manager, None, None, log_store=store)
+    yield SimpleNamespace(db=db, store=store, bot=bot, handlers=handlers, deployed=deployed)
+    store.close()
+    db.close()
+
+async def _add_project(env, telegram_id: int, name: str):
+    await env.handlers.handle_start(_message(telegram_id, '/start'))
+    env.handlers.waiting_for_project_data = True
+    await env.handlers.handle_message(_message(telegram_id, f"{name}|https://example.com/{name}.git|main"))
+    user = await env.db.get_user(str(telegram_id))
+    projects = await env.db.get_projects(user.id)
+    assert [project.name for project in projects] == [name]
+    return projects[0]
+
+def test_logs_query_shows_own_project_logs(env):
+    async def scenario():
+        own = await _add_project(env, 987654321, 'own')
+        other = await _add_project(env, 123456789, 'other')
+        now = time.time()
+        env.store.write_batch([
+            (now, 20, 'project_manager', own.id, 'own project deployed'),
+            (now, 20, 'project_manager', other.id, 'other project deployed'),
+        ]).result()
+
+        env.bot.sent.clear()
+        await env.handlers.handle_logs_query(_message(987654321, '/logs deployed'))
+        own_reply = env.bot.sent[-1]
+        await env.handlers.handle_logs_query(_message(987654321, f"/logs project={other.id}"))
+        return own_reply, env.bot.sent[-1]
+
+    own_reply, other_reply = asyncio.run(scenario())
+    assert 'own project deployed' in own_reply
+    assert 'other project deployed' not in own_reply
+    assert 'Проект не найден' in other_reply
+
+def test_deploy_streams_build_output(env):
+    async def scenario():
+        own = await _add_project(env, 987654321, 'own')
+        other = await _add_project(env, 123456789, 'other')
+        await env.handlers.handle_callback(_callback(987654321, f"project_{own.id}"))
+        await env.handlers.handle_callback(_callback(987654321, f"project_{other.id}"))
+
+    asyncio.run(scenario())
+    assert env.deployed == ['own']
+    assert any('Collecting requests' in text and 'pip warning' in text for text in env.bot.edited)
+    assert env.bot.edited[-1] == '✅ Проект развернут: own'
+    assert '❌ Проект не найден' in env.bot.sent
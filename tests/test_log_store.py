@@ -0,0 +1,16 @@
+import asyncio
+import logging
+from database.log_store import LogStore, LogStoreHandler
+
+def test_handler_flushes_on_close_and_closes_twice(tmp_path):
+    store = LogStore(str(tmp_path / 'logs.db'))
+    handler = LogStoreHandler(store, flush_interval=60)
+    handler.emit(logging.makeLogRecord({'name': 'test', 'levelno': logging.INFO, 'msg': 'deployed'}))
+
+    handler.close()
+    # Повторное закрытие (перезапуск конвейера и logging.shutdown при выходе)
+    handler.close()
+
+    records = asyncio.run(store.query())
+    store.close()
+    assert [record.message for record in records] == ['deployed']
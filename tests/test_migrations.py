@@ -0,0 +1,91 @@
+import sqlite3
+import pytest
+from database.migrations import MIGRATIONS, migrate
+
+# Запросы DatabaseManager, для которых добавлены индексы
+GET_PROJECTS = 'SELECT * FROM projects WHERE user_id = ?'
+GET_PROJECT_CONFIG = 'SELECT var_name, var_value FROM project_configs WHERE project_id = ? AND is_test = ?'
+GET_CHANGED_PROJECTS = 'SELECT * FROM projects WHERE revision > ?'
+
+# Схема базы до появления миграций
+BASELINE_SCHEMA = '''
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        telegram_id TEXT UNIQUE NOT NULL,
+        username TEXT NOT NULL,
+        is_active BOOLEAN DEFAULT TRUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE projects (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        repo_url TEXT NOT NULL,
+        project_path TEXT NOT NULL,
+        check_interval INTEGER NOT NULL,
+        last_commit TEXT,
+        is_running BOOLEAN DEFAULT FALSE,
+        branch TEXT DEFAULT 'main',
+        FOREIGN KEY (user_id) REFERENCES users (id),
+        UNIQUE(user_id, name)
+    );
+    CREATE TABLE project_configs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        project_id INTEGER,
+        var_name TEXT NOT NULL,
+        var_value TEXT NOT NULL,
+        is_test BOOLEAN DEFAULT FALSE,
+        FOREIGN KEY (project_id) REFERENCES projects (id),
+        UNIQUE(project_id, var_name, is_test)
+    );
+'''
+
+def _plan(conn: sqlite3.Connection, sql: str, params: tuple) -> str:
+    return ' '.join(row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params))
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'test.db')
+    yield conn
+    conn.close()
+
+def test_migrate_fresh_database(conn):
+    assert migrate(conn) == MIGRATIONS[-1][0]
+    # Повторный запуск ничего не применяет
+    assert migrate(conn) == MIGRATIONS[-1][0]
+
+@pytest.mark.parametrize('sql, params, index', [
+    (GET_PROJECTS, (1,), 'idx_projects_user_id'),
+    (GET_PROJECT_CONFIG, (1, False), 'idx_project_configs_project'),
+    (GET_CHANGED_PROJECTS, (10,), 'idx_projects_revision'),
+])
+def test_hot_queries_use_indexes(conn, sql, params, index):
+    migrate(conn)
+    assert index in _plan(conn, sql, params)
+
+def test_migrate_baseline_database(conn):
+    conn.executescript(BASELINE_SCHEMA)
+    conn.execute("INSERT INTO users (telegram_id, username) VALUES ('1', 'user')")
+    conn.execute('''
+        INSERT INTO projects (user_id, name, repo_url, project_path, check_interval)
+        VALUES (1, 'project', 'https://example.com/repo.git', '/projects/project', 300)
+    ''')
+    conn.commit()
+
+    assert migrate(conn) == MIGRATIONS[-1][0]
+    # Существующие данные сохранены, новая колонка получила значение по умолчанию
+    assert conn.execute('SELECT name, revision FROM projects').fetchall() == [('project', 0)]
+    assert 'idx_projects_user_id' in _plan(conn, GET_PROJECTS, (1,))
+
+def test_migrate_project_owner_ids(conn):
+    conn.executescript(BASELINE_SCHEMA)
+    conn.execute("INSERT INTO users (telegram_id, username) VALUES ('987654321', 'user')")
+    # Проект сохранен с telegram id владельца
+    conn.execute('''
+        INSERT INTO projects (user_id, name, repo_url, project_path, check_interval)
+        VALUES (987654321, 'project', 'https://example.com/repo.git', '/projects/project', 300)
+    ''')
+    conn.commit()
+
+    migrate(conn)
+    assert conn.execute('SELECT user_id FROM projects').fetchall() == [(1,)]
@@ -0,0 +1,15 @@
+import asyncio
+from core.project_manager import ProjectManager
+from database.db_manager import DatabaseManager
+
+def test_create_project_notifies_scheduler(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'test.db'))
+    notified = []
+    project_manager = ProjectManager(db, str(tmp_path / 'projects'),
+                                     on_projects_changed=lambda: notified.append(True))
+    try:
+        project = asyncio.run(project_manager.create_project(1, 'app', 'https://example.com/app.git', 'develop'))
+        assert project.branch == 'develop'
+        assert notified == [True]
+    finally:
+        db.close()
@@ -0,0 +1,34 @@
+import os
+from typing import List
+
+def dir_size(path: str) -> int:
+    """Размер директории в байтах (без перехода по симлинкам)"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+def tail_lines(path: str, count: int, block_size: int = 8192) -> List[str]:
+    """Последние count строк файла: чтение блоками с конца, память не зависит от размера файла"""
+    if count <= 0:
+        return []
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        blocks = []
+        newlines = 0
+        # Нужен count + 1 перевод строки, чтобы первая строка была целой
+        while position > 0 and newlines <= count:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            block = f.read(size)
+            blocks.append(block)
+            newlines += block.count(b'\n')
+    data = b''.join(reversed(blocks))
+    lines = data.decode('utf-8', errors='replace').splitlines(keepends=True)
+    return lines[-count:]
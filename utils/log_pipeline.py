@@ -0,0 +1,138 @@
+import time
+import queue
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import List
+from database.log_store import project_id_var
+
+class DroppingQueueHandler(QueueHandler):
+    """Постановка записей в ограниченную очередь без блокировки вызывающего кода.
+
+    При переполнении запись отбрасывается и учитывается в dropped.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Контекст задачи недоступен в потоке слушателя - фиксируем проект здесь
+        if getattr(record, 'project_id', None) is None:
+            record.project_id = project_id_var.get()
+        return super().prepare(record)
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+class BatchEmitMixin:
+    """Запись пачки записей в поток одним write и одним flush"""
+
+    def emit_batch(self, records: List[logging.LogRecord]):
+        lines = []
+        for record in records:
+            if record.levelno >= self.level and self.filter(record):
+                try:
+                    lines.append(self.format(record) + self.terminator)
+                except Exception:
+                    self.handleError(record)
+        if not lines:
+            return
+        text = ''.join(lines)
+        self.acquire()
+        try:
+            if isinstance(self, RotatingFileHandler):
+                self._rollover_before(text)
+            self.stream.write(text)
+            self.flush()
+        except Exception:
+            self.handleError(records[-1])
+        finally:
+            self.release()
+
+class BatchStreamHandler(BatchEmitMixin, logging.StreamHandler):
+    pass
+
+class BatchRotatingFileHandler(BatchEmitMixin, RotatingFileHandler):
+    def _rollover_before(self, text: str):
+        if self.stream is None:
+            self.stream = self._open()
+        if self.maxBytes > 0 and self.stream.tell() + len(text) >= self.maxBytes and self.stream.tell():
+            self.doRollover()
+
+class BatchingQueueListener(QueueListener):
+    """Слушатель очереди, разбирающий записи пачками до batch_size штук.
+
+    Обработчики с emit_batch получают пачку целиком, остальные - по записи.
+    Об отброшенных при переполнении записях сообщает не чаще раза в report_interval секунд.
+    """
+
+    def __init__(self, log_queue: queue.Queue, *handlers, batch_size: int = 500,
+                 queue_handler: DroppingQueueHandler = None, report_interval: float = 5.0):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.batch_size = max(1, batch_size)
+        self.queue_handler = queue_handler
+        self.report_interval = report_interval
+        self._reported_drops = 0
+        self._reported_at = 0.0
+
+    def stop(self):
+        # Повторная остановка (перезапуск main() и atexit) ничего не делает
+        if self._thread:
+            super().stop()
+
+    def enqueue_sentinel(self):
+        # Сигнал остановки не должен теряться при заполненной очереди
+        self.queue.put(self._sentinel)
+
+    def _drain(self) -> List:
+        batch = [self.queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _dispatch(self, records: List[logging.LogRecord]):
+        for handler in self.handlers:
+            if hasattr(handler, 'emit_batch'):
+                handler.emit_batch(records)
+            else:
+                for record in records:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+
+    def _report_drops(self, force: bool = False):
+        dropped = self.queue_handler.dropped if self.queue_handler else 0
+        now = time.monotonic()
+        if dropped > self._reported_drops and (force or now - self._reported_at >= self.report_interval):
+            record = logging.LogRecord(
+                'log_pipeline', logging.WARNING, __file__, 0,
+                f"Log queue overflow: {dropped - self._reported_drops} records dropped "
+                f"({dropped} total)", None, None
+            )
+            self._reported_drops = dropped
+            self._reported_at = now
+            self._dispatch([record])
+
+    def _monitor(self):
+        stop = False
+        while not stop:
+            batch = self._drain()
+            records = []
+            for record in batch:
+                if record is self._sentinel:
+                    stop = True
+                else:
+                    records.append(record)
+            if records:
+                self._dispatch(records)
+            self._report_drops(force=stop)
+            for _ in batch:
+                self.queue.task_done()